@@ -1,7 +1,175 @@
-from django.contrib import admin
+from typing import Any, Dict, Optional, Tuple
 
-# Register your models here.
+from django import forms
+from django.conf import settings
+from django.contrib import admin
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.http import HttpRequest
+from django.urls import reverse
+from django.utils.functional import cached_property
+from django.utils.html import format_html
+from django.utils.safestring import SafeString
 
 from . import models
+from .services import ArticleService, CategoryService, SiteMismatchError
+
+
+def _estimate_rows(queryset: QuerySet[Any]) -> Optional[int]:
+  # Row count from the table statistics, None where the database has none
+  connection = connections[queryset.db]
+  table = queryset.model._meta.db_table
+  if connection.vendor == 'mysql':
+    sql = 'SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s'
+  elif connection.vendor == 'postgresql':
+    sql = 'SELECT reltuples::bigint FROM pg_class WHERE relname = %s'
+  else:
+    return None
+  with connection.cursor() as cursor:
+    cursor.execute(sql, [table])
+    row = cursor.fetchone()
+  return int(row[0]) if row and row[0] is not None else None
+
+
+class EstimatedCountPaginator(Paginator):
+  '''
+  Uses the table statistics instead of COUNT(*) for unfiltered lists of
+  tables larger than CMS_ADMIN_EXACT_COUNT_LIMIT rows.
+  '''
+
+  @cached_property
+  def count(self) -> int:
+    queryset = self.object_list
+    if isinstance(queryset, QuerySet) and not queryset.query.where:
+      estimate = _estimate_rows(queryset)
+      if estimate is not None and estimate > settings.CMS_ADMIN_EXACT_COUNT_LIMIT:
+        return estimate
+    return super().count
+
+
+class CategoryIdWidget(forms.NumberInput):
+  '''
+  Category id input with a lookup popup on the category list, instead of a
+  select loading every category.
+  '''
+
+  def render(self, name: str, value: Any, attrs: Optional[Dict[str, Any]] = None,
+             renderer: Any = None) -> SafeString:
+    html = super().render(name, value, attrs, renderer)
+    # Forms with errors render the input as it was entered
+    try:
+      id = int(value) if value else 0
+    except (TypeError, ValueError):
+      id = 0
+    category = models.Category.objects.filter(id=id).first() if id else None
+    return format_html(
+      '{} <a href="{}?_popup=1" class="related-lookup" id="lookup_{}" title="Lookup"></a> <strong>{}</strong>',
+      html,
+      reverse('admin:cms_category_changelist'),
+      (attrs or {}).get('id', f'id_{name}'),
+      category.long_name if category else '',
+    )
+
+
+class CmsModelAdmin(admin.ModelAdmin):
+  ordering = ('-id',)
+  paginator = EstimatedCountPaginator
+  show_full_result_count = False
+  category_fields: Tuple[str, ...] = ()
+
+  def get_readonly_fields(self, request: HttpRequest, obj: Any = None) -> Any:
+    # Objects stay in the site they were created in
+    readonly = super().get_readonly_fields(request, obj)
+    return tuple(readonly) + ('site',) if obj is not None else readonly
+
+  def formfield_for_dbfield(self, db_field: Any, request: HttpRequest, **kwargs: Any) -> Any:
+    if db_field.name in self.category_fields:
+      kwargs['widget'] = CategoryIdWidget
+    return super().formfield_for_dbfield(db_field, request, **kwargs)
+
+
+class SiteCategoryForm(forms.ModelForm):
+  # Field referencing a category, which must belong to the site of the object
+  category_field = ''
+
+  def clean(self) -> Dict[str, Any]:
+    cleaned_data = super().clean()
+    # site is read only once the object exists
+    site = cleaned_data.get('site', self.instance.site)
+    category = cleaned_data.get(self.category_field)
+    if category is not None:
+      try:
+        CategoryService._check_site(category, site)
+      except SiteMismatchError:
+        self.add_error(self.category_field, 'The category belongs to another site.')
+    return cleaned_data
+
+
+class ArticleAdminForm(SiteCategoryForm):
+  category_field = 'category'
+
+
+@admin.register(models.Article)
+class ArticleAdmin(CmsModelAdmin):
+  form = ArticleAdminForm
+  list_display = ('name', 'site', 'title', 'category', 'author', 'visible', 'direct_links_only', 'mtime')
+  search_fields = ('^name', '^title')
+  readonly_fields = ('author', 'ctime', 'mtime')
+  category_fields = ('category',)
+
+  def get_queryset(self, request: HttpRequest) -> QuerySet[models.Article]:
+    return super().get_queryset(request).defer('content')
+
+  def save_model(self, request: HttpRequest, obj: models.Article, form: Any, change: bool) -> None:
+    # Through the services, which keep the counts and caches up to date
+    if change:
+      saved = ArticleService.update(
+        models.Article.objects.get(id=obj.id),
+        name=obj.name, author=None, title=obj.title, content=obj.content, category=obj.category,
+        visible=obj.visible, direct_links_only=obj.direct_links_only,
+        publish_at=obj.publish_at, expire_at=obj.expire_at)
+    else:
+      author = request.user.id
+      if author is None:
+        raise PermissionDenied()
+      saved = ArticleService.create(
+        name=obj.name, author=author, title=obj.title, content=obj.content, category=obj.category,
+        visible=obj.visible, direct_links_only=obj.direct_links_only,
+        publish_at=obj.publish_at, expire_at=obj.expire_at, site=obj.site)
+    obj.id, obj.author, obj.mtime = saved.id, saved.author, saved.mtime
+
+
+class CategoryAdminForm(SiteCategoryForm):
+  category_field = 'parent'
+
+  def clean_parent(self) -> int:
+    parent = self.cleaned_data['parent']
+    if self.instance.id and parent in CategoryService._get_descendant_ids(self.instance.id, self.instance.site):
+      raise forms.ValidationError('A category cannot be moved under itself.')
+    return parent
+
+
+@admin.register(models.Category)
+class CategoryAdmin(CmsModelAdmin):
+  form = CategoryAdminForm
+  list_display = ('name', 'site', 'long_name', 'parent', 'article_count', 'total_article_count')
+  search_fields = ('^name',)
+  readonly_fields = tuple(models.Category.COUNT_FIELDS) + ('ctime', 'mtime')
+  category_fields = ('parent',)
+
+  def save_model(self, request: HttpRequest, obj: models.Category, form: Any, change: bool) -> None:
+    if change:
+      saved = CategoryService.update(
+        models.Category.objects.get(id=obj.id),
+        name=obj.name, long_name=obj.long_name, parent=obj.parent)
+    else:
+      saved = CategoryService.create(name=obj.name, long_name=obj.long_name, parent=obj.parent, site=obj.site)
+    obj.id, obj.mtime = saved.id, saved.mtime
+
 
-admin.site.register(models.Article)
+@admin.register(models.Site)
+class SiteAdmin(admin.ModelAdmin):
+  list_display = ('name', 'domain', 'title', 'base_url')
+  readonly_fields = ('ctime', 'mtime')
@@ -4,5 +4,8 @@ from . import views
 app_name = 'api'
 urlpatterns = [
   path('article', views.ArticleView.as_view(), name='article'),
+  path('article/revisions', views.ArticleRevisionView.as_view(), name='article_revisions'),
   path('category', views.CategoryView.as_view(), name='category'),
+  path('metrics', views.MetricsView.as_view(), name='metrics'),
+  path('profiles', views.ProfileView.as_view(), name='profiles'),
 ]
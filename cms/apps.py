@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class CmsConfig(AppConfig):
   name = 'cms'
+
+  def ready(self) -> None:
+    from . import auth  # noqa: F401, connects the signal receivers
+    from . import checks  # noqa: F401, registers the system checks
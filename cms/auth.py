@@ -0,0 +1,50 @@
+from typing import Any, Optional
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_out
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .services import AUTHOR_NAME_CACHE_KEY, ApiTokenService
+
+USER_CACHE_KEY = 'cms:user:{}'
+
+
+class CachedModelBackend(ModelBackend):
+  '''
+  Reads the users of authenticated sessions and API tokens through the
+  cache. Entries are dropped when the user is saved (e.g. on password
+  change), deleted or logs out.
+  '''
+
+  def get_user(self, user_id: Any) -> Optional[User]:
+    key = USER_CACHE_KEY.format(user_id)
+    user: Optional[User] = cache.get(key)
+    if user is None:
+      user = super().get_user(user_id)  # type: ignore
+      if user is not None:
+        cache.set(key, user, settings.CMS_USER_CACHE_SECONDS)
+    return user
+
+
+@receiver(post_save, sender=User)
+def _expire_saved_user(sender: Any, instance: User, **kwargs: Any) -> None:
+  cache.delete_many([
+    USER_CACHE_KEY.format(instance.pk),
+    AUTHOR_NAME_CACHE_KEY.format(instance.pk),
+  ])
+
+
+@receiver(post_delete, sender=User)
+def _expire_deleted_user(sender: Any, instance: User, **kwargs: Any) -> None:
+  _expire_saved_user(sender, instance)
+  ApiTokenService.delete_for_user(instance.pk)
+
+
+@receiver(user_logged_out)
+def _expire_logged_out_user(sender: Any, user: Optional[User], **kwargs: Any) -> None:
+  if user is not None:
+    cache.delete(USER_CACHE_KEY.format(user.pk))
@@ -0,0 +1,24 @@
+from django.contrib.auth.views import LoginView as BaseLoginView
+from django.http import HttpRequest, HttpResponse
+from django.middleware import csrf
+from django.views import View
+
+from .views import CmsViewMixin
+
+
+class UserView(CmsViewMixin, View):
+  def get(self, request: HttpRequest) -> HttpResponse:
+    return HttpResponse(csrf.get_token(request))
+
+  def head(self, request: HttpRequest) -> HttpResponse:
+    return HttpResponse('head ' + str(request.__class__))
+
+  def post(self, request: HttpRequest) -> HttpResponse:
+    return HttpResponse('post ' + str(request.__class__))
+
+  def put(self, request: HttpRequest) -> HttpResponse:
+    return HttpResponse('put ' + str(request.__class__))
+
+
+class LoginView(CmsViewMixin, BaseLoginView):
+  template_name = 'login.html'
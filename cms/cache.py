@@ -0,0 +1,181 @@
+import math
+import threading
+import time
+from typing import Callable, Dict, Generic, Optional, Tuple, TypeVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .ratelimit import Overloaded
+
+T = TypeVar('T')
+
+
+class _Call(Generic[T]):
+  def __init__(self) -> None:
+    self.done = threading.Event()
+    self.result: Optional[T] = None
+    self.error: Optional[BaseException] = None
+
+
+class SingleFlight(Generic[T]):
+  '''
+  Collapses concurrent calls sharing a key into a single execution.
+  The first caller runs the function, the others wait and get its result.
+  '''
+
+  def __init__(self) -> None:
+    self._lock = threading.Lock()
+    self._calls: Dict[str, _Call[T]] = {}
+
+  def do(self, key: str, fn: Callable[[], T]) -> T:
+    with self._lock:
+      call = self._calls.get(key)
+      leader = call is None
+      if call is None:
+        call = _Call()
+        self._calls[key] = call
+    if not leader:
+      call.done.wait()
+      if call.error is not None:
+        raise call.error
+      return call.result  # type: ignore
+    try:
+      call.result = fn()
+      return call.result
+    except BaseException as e:
+      call.error = e
+      raise
+    finally:
+      with self._lock:
+        del self._calls[key]
+      call.done.set()
+
+
+# Fresh until, valid until (s) and the page
+PageEntry = Tuple[float, float, str]
+
+
+class PageCache:
+  '''
+  Rendered page cache with stale-while-revalidate semantics.
+  A fresh entry is served as is. Once it goes stale, a single caller
+  re-renders it while everyone else keeps getting the stale copy.
+  Misses are coalesced so that a page is rendered once per process.
+  A stale page is also served when its refresh is shed under load.
+  '''
+
+  def __init__(
+      self,
+      prefix: str,
+      fresh_setting: str = 'CMS_PAGE_CACHE_FRESH_SECONDS',
+      stale_setting: str = 'CMS_PAGE_CACHE_STALE_SECONDS',
+  ) -> None:
+    self.prefix = prefix
+    self.fresh_setting = fresh_setting
+    self.stale_setting = stale_setting
+    self._flight: SingleFlight[Optional[str]] = SingleFlight()
+
+  def _key(self, key: str) -> str:
+    return f'{self.prefix}:{key}'
+
+  def _fresh_seconds(self) -> float:
+    return float(getattr(settings, self.fresh_setting))
+
+  def _stale_seconds(self) -> float:
+    return float(getattr(settings, self.stale_setting))
+
+  def _render(
+      self,
+      key: str,
+      render: Callable[[], Optional[str]],
+      valid_until: Optional[Callable[[], float]],
+  ) -> Optional[str]:
+    until = valid_until() if valid_until else math.inf
+    body = render()
+    if body is None:
+      cache.delete(key)
+      return None
+    now = time.time()
+    fresh = self._fresh_seconds()
+    timeout = fresh + self._stale_seconds()
+    if until < now + timeout:
+      timeout = math.ceil(until - now)
+      if timeout <= 0:
+        return body
+    entry: PageEntry = (min(now + fresh, until), until, body)
+    cache.set(key, entry, timeout)
+    return body
+
+  def get(
+      self,
+      key: str,
+      render: Callable[[], Optional[str]],
+      valid_until: Optional[Callable[[], float]] = None,
+  ) -> Optional[str]:
+    '''
+    Returns the page stored under key, rendering it if needed.
+    render returns None when the page does not exist, which is not cached.
+    valid_until returns the time (s) at which a page rendered now becomes
+    wrong, past it the page is neither fresh nor served stale.
+    '''
+    full_key = self._key(key)
+    entry: Optional[PageEntry] = cache.get(full_key)
+    now = time.time()
+    # Past valid_until the page is not served even stale
+    if entry is not None and now < entry[1]:
+      fresh_until, until, body = entry
+      if now < fresh_until:
+        return body
+      lock_key = full_key + ':refresh'
+      if not cache.add(lock_key, True, self._fresh_seconds() or 1):
+        return body
+      try:
+        return self._flight.do(full_key, lambda: self._render(full_key, render, valid_until))
+      except Overloaded:
+        return body
+      finally:
+        cache.delete(lock_key)
+    return self._flight.do(full_key, lambda: self._render(full_key, render, valid_until))
+
+  def expire(self, *keys: str) -> None:
+    '''Marks the given pages stale, they are refreshed on the next read.'''
+    for key in keys:
+      full_key = self._key(key)
+      entry: Optional[PageEntry] = cache.get(full_key)
+      if entry is not None:
+        cache.set(full_key, (0.0, entry[1], entry[2]), self._stale_seconds())
+
+  def delete(self, *keys: str) -> None:
+    '''Drops the given pages, for pages that must not be served even stale.'''
+    cache.delete_many([self._key(key) for key in keys])
+
+
+SITE_GENERATION_CACHE_KEY = 'cms:site:generation:{}'
+
+
+def site_prefix(site: int) -> str:
+  '''Prefix of the page and feed keys of the site, which changes when its pages are all dropped.'''
+  key = SITE_GENERATION_CACHE_KEY.format(site)
+  generation: Optional[int] = cache.get(key)
+  if generation is None:
+    # Starting from the current time, pages of an evicted generation are not reached again
+    cache.add(key, int(time.time() * 1000), None)
+    generation = cache.get(key)
+  return f'{site}:{generation}'
+
+
+def drop_site(site: int) -> None:
+  '''Drops all pages and feeds of the site at once. The cache evicts them once unused.'''
+  key = SITE_GENERATION_CACHE_KEY.format(site)
+  cache.add(key, int(time.time() * 1000), None)
+  try:
+    cache.incr(key)
+  except ValueError:
+    # Evicted since it was added, the next read starts a new generation
+    pass
+
+
+page_cache = PageCache('cms:page')
+# Sitemaps and feeds only change through writes, which expire them
+feed_cache = PageCache('cms:feed', 'CMS_FEED_CACHE_FRESH_SECONDS', 'CMS_FEED_CACHE_STALE_SECONDS')
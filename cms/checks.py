@@ -0,0 +1,29 @@
+from typing import Any, List
+
+from django.conf import settings
+from django.core.checks import CheckMessage, Error, Warning, register
+
+LOCAL_CACHES = ['django.core.cache.backends.locmem.LocMemCache', 'django.core.cache.backends.dummy.DummyCache']
+
+
+def _local_cache() -> bool:
+  return settings.CACHES.get('default', {}).get('BACKEND') in LOCAL_CACHES
+
+
+@register()
+def check_shared_cache(app_configs: Any, **kwargs: Any) -> List[CheckMessage]:
+  '''Tasks of the database queue expire caches from the worker process, which must share them.'''
+  if settings.CMS_TASK_QUEUE == 'database' and _local_cache():
+    return [Error(
+      'CMS_TASK_QUEUE is "database" but the default cache is local to each process.',
+      hint='Configure a shared cache backend in CACHES, e.g. memcached, or use the "local" queue.',
+      id='cms.E001',
+    )]
+  if _local_cache():
+    # Writes expire the cached category tree in their own process only
+    return [Warning(
+      'The default cache is local to each process, writes do not reach the caches of other workers.',
+      hint='Configure a shared cache backend in CACHES unless the site runs in a single process.',
+      id='cms.W001',
+    )]
+  return []
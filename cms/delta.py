@@ -0,0 +1,30 @@
+import difflib
+from typing import List, Union
+
+# A delta is a list of operations building the new text from the old one:
+# [start, end] copies old lines, a string inserts new text
+Delta = List[Union[List[int], str]]
+
+
+def diff(old: str, new: str) -> Delta:
+  old_lines = old.splitlines(keepends=True)
+  new_lines = new.splitlines(keepends=True)
+  delta: Delta = []
+  matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+  for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+    if tag == 'equal':
+      delta.append([i1, i2])
+    elif j1 < j2:
+      delta.append(''.join(new_lines[j1:j2]))
+  return delta
+
+
+def apply(old: str, delta: Delta) -> str:
+  old_lines = old.splitlines(keepends=True)
+  parts = []
+  for op in delta:
+    if isinstance(op, str):
+      parts.append(op)
+    else:
+      parts.extend(old_lines[op[0]:op[1]])
+  return ''.join(parts)
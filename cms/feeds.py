@@ -0,0 +1,127 @@
+import datetime
+from typing import Iterable, Iterator, List, Optional, Tuple
+from xml.sax.saxutils import escape, quoteattr
+
+from django.conf import settings
+from django.db.models import Max
+from django.urls import reverse
+
+from .models import Article, Category, Site
+from .services import ArticleService, CategoryService, UserSettingsService
+
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+ATOM_NS = 'http://www.w3.org/2005/Atom'
+
+
+def _url(site: Site, path: str) -> str:
+  return site.base_url.rstrip('/') + path
+
+
+def _time(ms: int) -> str:
+  return datetime.datetime.fromtimestamp(ms / 1000.0, tz=datetime.timezone.utc).isoformat(timespec='seconds')
+
+
+class Sitemap:
+  '''
+  Sitemap split into chunks of CMS_SITEMAP_CHUNK_SIZE consecutive article
+  ids, so that a write only invalidates the chunk of its article.
+  '''
+
+  @classmethod
+  def chunk_of(cls, article_id: int) -> int:
+    return article_id // settings.CMS_SITEMAP_CHUNK_SIZE
+
+  @classmethod
+  def _urlset(cls, site: Site, entries: Iterable[Tuple[str, int]]) -> str:
+    parts = [XML_HEADER, f'<urlset xmlns="{SITEMAP_NS}">\n']
+    for path, mtime in entries:
+      parts.append(f'<url><loc>{escape(_url(site, path))}</loc><lastmod>{_time(mtime)}</lastmod></url>\n')
+    parts.append('</urlset>\n')
+    return ''.join(parts)
+
+  @classmethod
+  def _last_chunk(cls, site: Site) -> int:
+    return cls.chunk_of(Article.objects.filter(site=site.id).aggregate(id=Max('id'))['id'] or 0)
+
+  @classmethod
+  def render_index(cls, site: Site) -> str:
+    paths = [reverse('cms:sitemap_categories')] + [
+      reverse('cms:sitemap_chunk', args=[chunk])
+      for chunk in range(cls._last_chunk(site) + 1)
+    ]
+    parts = [XML_HEADER, f'<sitemapindex xmlns="{SITEMAP_NS}">\n']
+    for path in paths:
+      parts.append(f'<sitemap><loc>{escape(_url(site, path))}</loc></sitemap>\n')
+    parts.append('</sitemapindex>\n')
+    return ''.join(parts)
+
+  @classmethod
+  def render_chunk(cls, site: Site, chunk: int) -> Optional[str]:
+    # Only chunks listed in the index exist, others must not fill the cache
+    if chunk > cls._last_chunk(site):
+      return None
+    size = settings.CMS_SITEMAP_CHUNK_SIZE
+    rows: Iterator[Tuple[str, int]] = (
+      ArticleService._get_base_query(range_query=False, site=site.id)
+      .filter(id__gte=chunk * size, id__lt=(chunk + 1) * size)
+      .order_by('id')
+      .values_list('name', 'mtime')
+      .iterator(chunk_size=2000))
+    return cls._urlset(site, (
+      (reverse('cms:article', args=[name]), mtime)
+      for name, mtime in rows))
+
+  @classmethod
+  def render_categories(cls, site: Site) -> str:
+    rows: Iterator[Tuple[str, int, int]] = (
+      Category.objects
+      .filter(site=site.id)
+      .order_by('id')
+      .values_list('name', 'mtime', 'latest_article_mtime')
+      .iterator(chunk_size=2000))
+    return cls._urlset(site, (
+      (reverse('cms:category', args=[name]), max(mtime, latest))
+      for name, mtime, latest in rows))
+
+
+class AtomFeed:
+  '''Atom feed of the latest articles of the site or of a category and its descendants.'''
+
+  @classmethod
+  def render(cls, site: Site, category_name: Optional[str] = None) -> Optional[str]:
+    q = ArticleService._get_base_query(site=site.id)
+    title = site.title
+    path = reverse('cms:index')
+    if category_name is not None:
+      category = CategoryService.get_by_name(category_name, site.id)
+      if category is None:
+        return None
+      q = q.filter(category__in=CategoryService._get_descendant_ids(category.id, site.id))
+      title = category.long_name
+      path = reverse('cms:category', args=[category.name])
+    rows: List[Tuple[str, str, int, int, int]] = list(
+      q.order_by('-ctime')
+      .values_list('name', 'title', 'author', 'ctime', 'mtime')[:settings.CMS_FEED_SIZE])
+    author_names = UserSettingsService.get_author_names(row[2] for row in rows)
+    updated = max([mtime for name, article_title, author, ctime, mtime in rows], default=0)
+    parts = [
+      XML_HEADER,
+      f'<feed xmlns="{ATOM_NS}">\n',
+      f'<title>{escape(title)}</title>\n',
+      f'<id>{escape(_url(site, path))}</id>\n',
+      f'<link href={quoteattr(_url(site, path))}/>\n',
+      f'<updated>{_time(updated)}</updated>\n',
+      # Entries whose author is unknown fall back to the author of the feed
+      f'<author><name>{escape(site.title)}</name></author>\n',
+    ]
+    for name, article_title, author, ctime, mtime in rows:
+      url = _url(site, reverse('cms:article', args=[name]))
+      author_name = author_names.get(author)
+      author_element = f'<author><name>{escape(author_name)}</name></author>' if author_name else ''
+      parts.append(
+        f'<entry><title>{escape(article_title)}</title><id>{escape(url)}</id>'
+        f'<link href={quoteattr(url)}/><published>{_time(ctime)}</published>'
+        f'<updated>{_time(mtime)}</updated>{author_element}</entry>\n')
+    parts.append('</feed>\n')
+    return ''.join(parts)
@@ -0,0 +1,32 @@
+import time
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+from django.test import Client, override_settings
+
+
+class Command(BaseCommand):
+  help = 'Measures per request time of a path with and without the fast path middleware'
+
+  def add_arguments(self, parser: CommandParser) -> None:
+    parser.add_argument('path', nargs='?', default='/')
+    parser.add_argument('--requests', type=int, default=2000)
+
+  def _bench(self, path: str, requests: int, fast_path: bool) -> float:
+    with override_settings(CMS_FAST_PATH=fast_path, ALLOWED_HOSTS=['testserver']):
+      # The handler loads the middleware when the client is created
+      client = Client()
+      client.get(path)
+      start = time.perf_counter()
+      for i in range(requests):
+        client.get(path)
+      return (time.perf_counter() - start) / requests
+
+  def handle(self, *args: Any, **options: Any) -> None:
+    path, requests = options['path'], options['requests']
+    slow = self._bench(path, requests, False)
+    fast = self._bench(path, requests, True)
+    self.stdout.write(f'{path} over {requests} requests')
+    self.stdout.write(f'full middleware {slow * 1e6:.1f}us/request')
+    self.stdout.write(f'fast path       {fast * 1e6:.1f}us/request')
+    self.stdout.write(f'saved           {(slow - fast) * 1e6:.1f}us/request')
@@ -0,0 +1,23 @@
+from typing import Any
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from ...services import ApiTokenService
+
+
+class Command(BaseCommand):
+  help = 'Creates an API token for a user, sent as "Authorization: Token <key>"'
+
+  def add_arguments(self, parser: CommandParser) -> None:
+    parser.add_argument('username')
+    parser.add_argument('--revoke', action='store_true', help='Delete the existing tokens of the user first')
+
+  def handle(self, *args: Any, **options: Any) -> None:
+    try:
+      user = User.objects.get(username=options['username'])
+    except User.DoesNotExist:
+      raise CommandError(f'No user named {options["username"]}')
+    if options['revoke']:
+      ApiTokenService.delete_for_user(user.id)
+    self.stdout.write(ApiTokenService.create(user.id))
@@ -0,0 +1,53 @@
+import os
+import subprocess
+import sys
+from typing import Any, List, Tuple
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+STARTUP = '''
+import gazpacho.wsgi
+from django.urls import get_resolver
+get_resolver().url_patterns
+'''
+
+WARM_UP = '''
+from cms.warmup import warm_up
+warm_up()
+'''
+
+
+class Command(BaseCommand):
+  help = 'Profiles the imports done while a WSGI worker starts'
+
+  def add_arguments(self, parser: CommandParser) -> None:
+    parser.add_argument('--top', type=int, default=30, help='Number of modules to show')
+    parser.add_argument('--warm-up', action='store_true', help='Include the warm up step')
+    parser.add_argument('--sort-self', action='store_true', help='Sort by self instead of cumulative time')
+
+  def _profile(self, code: str) -> List[Tuple[int, int, str]]:
+    result = subprocess.run(
+      [sys.executable, '-X', 'importtime', '-c', code],
+      env=os.environ.copy(),
+      stdout=subprocess.DEVNULL,
+      stderr=subprocess.PIPE,
+      text=True,
+    )
+    if result.returncode != 0:
+      raise CommandError(result.stderr)
+    imports = []
+    for line in result.stderr.splitlines():
+      if not line.startswith('import time:') or 'self [us]' in line:
+        continue
+      self_us, cumulative_us, module = line[len('import time:'):].split('|')
+      imports.append((int(self_us), int(cumulative_us), module.rstrip()))
+    return imports
+
+  def handle(self, *args: Any, **options: Any) -> None:
+    imports = self._profile(STARTUP + (WARM_UP if options['warm_up'] else ''))
+    total = sum(self_us for self_us, cumulative_us, module in imports)
+    self.stdout.write(f'{len(imports)} modules imported in {total / 1000:.1f}ms')
+    imports.sort(key=lambda i: i[0] if options['sort_self'] else i[1], reverse=True)
+    self.stdout.write(f'{"self ms":>9} {"cumul ms":>9}  module')
+    for self_us, cumulative_us, module in imports[:options['top']]:
+      self.stdout.write(f'{self_us / 1000:9.1f} {cumulative_us / 1000:9.1f}  {module}')
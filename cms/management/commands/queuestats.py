@@ -0,0 +1,13 @@
+from typing import Any
+
+from django.core.management.base import BaseCommand
+
+from ...tasks import TaskQueue
+
+
+class Command(BaseCommand):
+  help = 'Prints the depth of the task queue'
+
+  def handle(self, *args: Any, **options: Any) -> None:
+    for key, value in TaskQueue.depth().items():
+      self.stdout.write(f'{key} {value}')
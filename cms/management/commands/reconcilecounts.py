@@ -0,0 +1,15 @@
+from typing import Any
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ...services import CategoryService
+
+
+class Command(BaseCommand):
+  help = 'Recomputes the article counts of categories'
+
+  def handle(self, *args: Any, **options: Any) -> None:
+    with transaction.atomic():
+      changed = CategoryService.reconcile_counts()
+    self.stdout.write(f'Repaired {changed} categories')
@@ -0,0 +1,36 @@
+import logging
+import time
+from typing import Any
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from ... import metrics
+from ... import services  # noqa: F401, registers the tasks
+from ...tasks import TaskQueue
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+  help = 'Runs queued follow-up tasks of writes'
+
+  def add_arguments(self, parser: CommandParser) -> None:
+    parser.add_argument('--once', action='store_true', help='Exit once the queue is drained')
+    parser.add_argument('--batch', type=int, default=100, help='Tasks to run between idle checks')
+    parser.add_argument('--sleep', type=float, default=1.0, help='Seconds to sleep when idle')
+    parser.add_argument('--stats-interval', type=float, default=60.0,
+                        help='Seconds between queue depth reports')
+
+  def handle(self, *args: Any, **options: Any) -> None:
+    last_report = 0.0
+    while True:
+      processed = TaskQueue.run_pending(options['batch'])
+      now = time.monotonic()
+      if now - last_report >= options['stats_interval']:
+        last_report = now
+        logger.info('queue %s, counters %s', TaskQueue.depth(), metrics.snapshot())
+      if processed:
+        continue
+      if options['once']:
+        break
+      time.sleep(options['sleep'])
@@ -0,0 +1,51 @@
+from typing import Any
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandParser
+
+from ...models import DEFAULT_SITE
+from ...seed import DatasetGenerator
+
+
+class Command(BaseCommand):
+  help = 'Generates a large deterministic dataset of categories and articles'
+
+  def add_arguments(self, parser: CommandParser) -> None:
+    parser.add_argument('--site', type=int, default=DEFAULT_SITE, help='Id of the site of generated objects')
+    parser.add_argument('--prefix', default='seed', help='Prefix of the names of generated objects')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the random generator')
+    parser.add_argument('--fanout', type=int, default=4, help='Children of each category')
+    parser.add_argument('--depth', type=int, default=3, help='Levels of the category tree')
+    parser.add_argument('--articles', type=int, default=1000)
+    parser.add_argument('--content-size', type=int, default=2000, help='Median content size in characters')
+    parser.add_argument('--content-spread', type=float, default=1.0,
+                        help='Sigma of the log-normal content size distribution')
+    parser.add_argument('--visible-ratio', type=float, default=0.95)
+    parser.add_argument('--direct-links-ratio', type=float, default=0.05)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--author', default='seed', help='Username of the author, created if missing')
+    parser.add_argument('--clear', action='store_true', help='Delete the articles and categories of the site first')
+
+  def handle(self, *args: Any, **options: Any) -> None:
+    author, created = User.objects.get_or_create(username=options['author'])
+    if created:
+      author.set_unusable_password()
+      author.save()
+    generator = DatasetGenerator(
+      author=author.id,
+      site=options['site'],
+      prefix=options['prefix'],
+      seed=options['seed'],
+      fanout=options['fanout'],
+      depth=options['depth'],
+      articles=options['articles'],
+      content_size=options['content_size'],
+      content_spread=options['content_spread'],
+      visible_ratio=options['visible_ratio'],
+      direct_links_ratio=options['direct_links_ratio'],
+      batch_size=options['batch_size'],
+      progress=self.stdout.write,
+    )
+    if options['clear']:
+      generator.clear()
+    generator.generate()
@@ -0,0 +1,16 @@
+import threading
+from typing import Dict
+
+_lock = threading.Lock()
+_counters: Dict[str, int] = {}
+
+
+def increment(name: str, value: int = 1) -> None:
+  with _lock:
+    _counters[name] = _counters.get(name, 0) + value
+
+
+def snapshot() -> Dict[str, int]:
+  '''Returns a copy of the counters of this process.'''
+  with _lock:
+    return dict(_counters)
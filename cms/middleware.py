@@ -0,0 +1,214 @@
+import cProfile
+import math
+import random
+import re
+import time
+from typing import Any, Callable, Optional
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.contrib.auth import middleware as auth
+from django.contrib.messages import middleware as messages
+from django.contrib.sessions import middleware as sessions
+from django.http import HttpRequest, HttpResponse, HttpResponseForbidden
+from django.http.request import split_domain_port
+from django.middleware import csrf
+
+from .auth import CachedModelBackend
+from .models import Site
+from .profiling import Profile, profiles, sampler
+from .ratelimit import RateLimiter
+from .services import ApiTokenService, SiteService
+
+GetResponse = Callable[[HttpRequest], HttpResponse]
+
+
+def is_fast_path(request: HttpRequest) -> bool:
+  return getattr(request, 'cms_fast_path', False)
+
+
+class ProfilingMiddleware:
+  '''
+  Profiles a CMS_PROFILE_SAMPLE_RATE fraction of requests with cProfile and
+  samples the stacks of requests slower than CMS_PROFILE_SLOW_MS, recording
+  their queries alongside, from the threshold on for slow requests. Only
+  installed when CMS_PROFILE is set, and should come first in MIDDLEWARE
+  to cover the other middleware.
+  '''
+
+  def __init__(self, get_response: GetResponse) -> None:
+    if not settings.CMS_PROFILE:
+      raise MiddlewareNotUsed()
+    self.get_response = get_response
+
+  def __call__(self, request: HttpRequest) -> HttpResponse:
+    sampled = random.random() < settings.CMS_PROFILE_SAMPLE_RATE
+    slow_ms = settings.CMS_PROFILE_SLOW_MS
+    if not sampled and slow_ms is None:
+      return self.get_response(request)
+    profile = Profile(request.method or '', request.get_full_path())
+    profiler = cProfile.Profile() if sampled else None
+    start = time.perf_counter()
+    with connection.execute_wrapper(profile.record_query):
+      if profiler is not None:
+        try:
+          profiler.enable()
+        except ValueError:
+          # Another thread holds the profiler on Python 3.12+
+          profiler = None
+      watched = profiler is None and slow_ms is not None
+      profile.recording = not watched
+      if watched:
+        sampler.watch(profile)
+      try:
+        response = self.get_response(request)
+      finally:
+        if profiler is not None:
+          profiler.disable()
+        if watched:
+          sampler.unwatch()
+    profile.duration_ms = (time.perf_counter() - start) * 1000.0
+    profile.status = response.status_code
+    if profiler is not None:
+      profile.set_stats(profiler)
+    if profiler is not None or (slow_ms is not None and profile.duration_ms >= slow_ms):
+      profiles.add(profile)
+    return response
+
+
+def get_site(request: HttpRequest) -> Site:
+  site: Site = request.cms_site  # type: ignore
+  return site
+
+
+class SiteMiddleware:
+  '''Resolves the site of the request from its host, see get_site.'''
+
+  def __init__(self, get_response: GetResponse) -> None:
+    self.get_response = get_response
+
+  def __call__(self, request: HttpRequest) -> HttpResponse:
+    domain, port = split_domain_port(request.get_host())
+    request.cms_site = SiteService.get_by_host(domain)  # type: ignore
+    return self.get_response(request)
+
+
+class FastPathMiddleware:
+  '''
+  Flags reads of public pages, which the middleware below skip entirely.
+  Must come before them in MIDDLEWARE.
+  '''
+
+  def __init__(self, get_response: GetResponse) -> None:
+    self.get_response = get_response
+    self.patterns = [re.compile(p) for p in settings.CMS_FAST_PATH_URLS]
+
+  def __call__(self, request: HttpRequest) -> HttpResponse:
+    request.cms_fast_path = (  # type: ignore
+      settings.CMS_FAST_PATH
+      and request.method in ('GET', 'HEAD')
+      and any(p.match(request.path_info) for p in self.patterns)
+    )
+    return self.get_response(request)
+
+
+def client_address(request: HttpRequest) -> str:
+  header = settings.CMS_CLIENT_ADDRESS_HEADER
+  address = request.META.get(header) if header else None
+  if address:
+    # The proxy appends the address it got the request from
+    return address.split(',')[-1].strip()
+  return request.META.get('REMOTE_ADDR', '')
+
+
+def too_many_requests(wait: float) -> HttpResponse:
+  response = HttpResponse(status=429)
+  response['Retry-After'] = str(math.ceil(wait))
+  return response
+
+
+class TokenAuthenticationMiddleware:
+  '''
+  Authenticates API clients sending "Authorization: Token <key>". These
+  requests take the fast path, so they never touch the session store and
+  are not subject to csrf checks. Must come after FastPathMiddleware.
+
+  Unknown tokens use up the rate limit of the address, and addresses over
+  their limit get no lookup at all, so guessing tokens cannot bypass
+  RateLimitMiddleware nor hammer the database.
+  '''
+
+  def __init__(self, get_response: GetResponse) -> None:
+    self.get_response = get_response
+    self.backend = CachedModelBackend()
+
+  def __call__(self, request: HttpRequest) -> HttpResponse:
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    if header.startswith('Token '):
+      address = 'addr:' + client_address(request)
+      wait = RateLimiter.peek(address)
+      if wait:
+        return too_many_requests(wait)
+      userid = ApiTokenService.get_user_id(header[len('Token '):].strip())
+      user = self.backend.get_user(userid) if userid is not None else None
+      if user is None:
+        wait = RateLimiter.take(address)
+        return too_many_requests(wait) if wait else HttpResponseForbidden()
+      request.user = user
+      request.cms_fast_path = True  # type: ignore
+    return self.get_response(request)
+
+
+class RateLimitMiddleware:
+  '''
+  Token bucket per client, answering 429 once a client is over
+  CMS_RATE_LIMIT_RATE requests per second with bursts of CMS_RATE_LIMIT_BURST.
+  Clients authenticated by token are limited per user, the others per
+  address. Must come after TokenAuthenticationMiddleware.
+  '''
+
+  def __init__(self, get_response: GetResponse) -> None:
+    self.get_response = get_response
+
+  def _client(self, request: HttpRequest) -> str:
+    user = getattr(request, 'user', None)
+    if user is not None:
+      return f'user:{user.id}'
+    return 'addr:' + client_address(request)
+
+  def __call__(self, request: HttpRequest) -> HttpResponse:
+    wait = RateLimiter.take(self._client(request))
+    if wait:
+      return too_many_requests(wait)
+    return self.get_response(request)
+
+
+class FastPathSkipMixin:
+  get_response: GetResponse
+
+  def __call__(self, request: HttpRequest) -> HttpResponse:
+    if is_fast_path(request):
+      return self.get_response(request)
+    return super().__call__(request)  # type: ignore
+
+  def process_view(self, request: HttpRequest, *args: Any) -> Optional[HttpResponse]:
+    if is_fast_path(request) or not hasattr(super(), 'process_view'):
+      return None
+    return super().process_view(request, *args)  # type: ignore
+
+
+class SessionMiddleware(FastPathSkipMixin, sessions.SessionMiddleware):
+  pass
+
+
+class CsrfViewMiddleware(FastPathSkipMixin, csrf.CsrfViewMiddleware):
+  pass
+
+
+class AuthenticationMiddleware(FastPathSkipMixin, auth.AuthenticationMiddleware):
+  pass
+
+
+class MessageMiddleware(FastPathSkipMixin, messages.MessageMiddleware):
+  pass
@@ -1,7 +1,9 @@
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
-from typing import Dict, Union, Optional
+from typing import Dict, List, Union, Optional
 from django.contrib.auth.models import User
 import datetime
+import json
 
 
 # Create your models here.
@@ -15,6 +17,14 @@ def timenow() -> int:
   return int(datetime.datetime.now().timestamp() * 1000.0)
 
 
+# A time (ms) that never comes. The largest integer JavaScript represents
+# exactly, so that API clients read and send it back unchanged.
+NEVER = 2 ** 53 - 1
+
+# Site of hosts without a Site of their own, configured by the CMS_SITE_* settings
+DEFAULT_SITE = 0
+
+
 class DbObject(models.Model):
   id = models.AutoField(primary_key=True)
   ctime = models.BigIntegerField('Creation time (ms)', default=timenow)
@@ -58,19 +68,61 @@ class NamedDbObject(DbObject):
     }
 
 
+class Site(NamedDbObject):
+  domain = models.CharField('Host name the site is served on', max_length=255, unique=True)
+  title = models.CharField('Title of the site', max_length=128)
+  slogan = models.CharField('Slogan of the site', max_length=256, blank=True, default='')
+  base_url = models.CharField('Absolute URL of the site in sitemaps and feeds', max_length=255)
+  sidebar = models.TextField('JSON encoded list of [name, url] links of the sidebar', default='[]')
+
+  def sidebar_links(self) -> List[List[str]]:
+    links: List[List[str]] = json.loads(self.sidebar)
+    return links
+
+  def _serialize_self(self, ss: SerializeSettings) -> Dict[str, Union[int, str, bool]]:
+    return {
+      'domain': self.domain,
+      'title': self.title,
+      'slogan': self.slogan,
+      'base_url': self.base_url,
+      'sidebar': self.sidebar,
+    }
+
+
+# Articles and categories belong to a site, their names are unique within
+# it and every query is scoped to it, so site leads their indexes.
+
 class Category(NamedDbObject):
+  name = models.CharField('Name of the object', max_length=128)
+  site = models.IntegerField('Site of the category', default=DEFAULT_SITE)
   long_name = models.CharField('Long name for display', max_length=128)
   parent = models.IntegerField('Parent category', default=0)
+  # Maintained by the services, counting articles listed in category pages
+  # whatever their publishing window
+  article_count = models.IntegerField('Number of listed articles in the category', default=0)
+  total_article_count = models.IntegerField('Number of listed articles including descendants', default=0)
+  latest_article_mtime = models.BigIntegerField('Latest modification time of a listed article (ms)', default=0)
+
+  COUNT_FIELDS = ['article_count', 'total_article_count', 'latest_article_mtime']
 
   class Meta:
     indexes = NamedDbObject.Meta.indexes + [
       models.Index(fields=['parent']),
+      # Prefix searches of the admin span sites, which (site, name) cannot serve
+      models.Index(fields=['name']),
+    ]
+    constraints = [
+      models.UniqueConstraint(fields=['site', 'name'], name='unique_category_site_name'),
     ]
 
   def _serialize_self(self, ss: SerializeSettings) -> Dict[str, Union[int, str, bool]]:
     return {
+      'site': self.site,
       'parent': self.parent,
       'long_name': self.long_name,
+      'article_count': self.article_count,
+      'total_article_count': self.total_article_count,
+      'latest_article_mtime': self.latest_article_mtime,
     }
 
 
@@ -79,19 +131,93 @@ class UserSettings(NamedDbObject):
 
 
 class Article(NamedDbObject):
+  name = models.CharField('Name of the object', max_length=128)
+  site = models.IntegerField('Site of the article', default=DEFAULT_SITE)
   author = models.IntegerField('Author of the article')
   category = models.IntegerField('Category of the article', default=0)
   title = models.CharField('Title of the article', max_length=128)
   content = models.TextField('Content of the article')
   visible = models.BooleanField('Is the article visible', default=True)
   direct_links_only = models.BooleanField('Should this article not show up in range queries', default=False)
+  # Visible articles are shown from publish_at until expire_at. Not null, so
+  # that the window is two plain range conditions on indexed columns.
+  publish_at = models.BigIntegerField(
+    'Time the article gets published (ms)', default=0,
+    validators=[MinValueValidator(0), MaxValueValidator(NEVER)])
+  expire_at = models.BigIntegerField(
+    'Time the article expires (ms)', default=NEVER,
+    validators=[MinValueValidator(0), MaxValueValidator(NEVER)])
+
+  class Meta:
+    indexes = NamedDbObject.Meta.indexes + [
+      # Prefix searches of the admin, which span sites
+      models.Index(fields=['name']),
+      models.Index(fields=['title']),
+      models.Index(fields=['site', 'category']),
+      # The publishing window and the next scheduled change
+      models.Index(fields=['site', 'publish_at', 'expire_at']),
+      models.Index(fields=['site', 'expire_at']),
+    ]
+    constraints = [
+      models.UniqueConstraint(fields=['site', 'name'], name='unique_article_site_name'),
+    ]
+
+  def is_scheduled(self) -> bool:
+    # Rows written before NEVER was JavaScript safe hold larger values
+    return self.publish_at != 0 or self.expire_at < NEVER
 
   def _serialize_self(self, ss: SerializeSettings) -> Dict[str, Union[int, str, bool]]:
     return {
+      'site': self.site,
       'author': self.author,
       'category': self.category,
       'title': self.title,
       'content': self.content,
       'visible': self.visible,
       'direct_links_only': self.direct_links_only,
+      'publish_at': self.publish_at,
+      'expire_at': min(self.expire_at, NEVER),
     }
+
+
+class Task(DbObject):
+  PENDING = 0
+  FAILED = 1
+
+  name = models.CharField('Name of the task function', max_length=128)
+  payload = models.TextField('JSON encoded keyword arguments')
+  status = models.SmallIntegerField('Status of the task', default=PENDING)
+  attempts = models.IntegerField('Number of failed attempts', default=0)
+  run_after = models.BigIntegerField('Earliest time to run (ms)', default=timenow)
+  last_error = models.TextField('Error of the last failed attempt', default='')
+  # Site whose caches the task expires, so that its tasks are found without reading payloads
+  site = models.IntegerField('Site of the task', default=DEFAULT_SITE)
+
+  class Meta:
+    indexes = DbObject.Meta.indexes + [
+      models.Index(fields=['status', 'run_after']),
+    ]
+
+
+class ApiToken(DbObject):
+  userid = models.IntegerField('Id of the user')
+  key_hash = models.CharField('SHA-256 of the token', max_length=64, unique=True)
+
+  class Meta:
+    indexes = DbObject.Meta.indexes + [
+      models.Index(fields=['userid']),
+    ]
+
+
+class ArticleRevision(DbObject):
+  article = models.IntegerField('Id of the article')
+  number = models.IntegerField('Revision number, starting from 1')
+  author = models.IntegerField('Author of the article at this revision')
+  snapshot = models.BooleanField('Is the content stored in full rather than as a delta')
+  data = models.BinaryField('zlib compressed JSON of the fields and the content or its delta')
+
+  class Meta:
+    indexes = DbObject.Meta.indexes
+    constraints = [
+      models.UniqueConstraint(fields=['article', 'number'], name='unique_article_revision'),
+    ]
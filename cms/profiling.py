@@ -0,0 +1,173 @@
+import collections
+import cProfile
+import io
+import itertools
+import marshal
+import pstats
+import sys
+import threading
+import time
+from types import FrameType
+from typing import Any, Callable, Counter, Deque, Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from .models import timenow
+
+# Queries kept per profile, a runaway loop must not exhaust the memory
+MAX_QUERIES = 1000
+MAX_STACK_DEPTH = 64
+
+
+class _LoadedStats:
+  # What pstats.Stats loads from a profiler
+  def __init__(self, data: bytes) -> None:
+    self.stats = marshal.loads(data)
+
+  def create_stats(self) -> None:
+    pass
+
+
+class Profile:
+  '''Timing and queries of a request, with its cProfile stats or sampled stacks.'''
+
+  def __init__(self, method: str, path: str) -> None:
+    self.id = 0
+    self.time = timenow()
+    self.method = method
+    self.path = path
+    self.status = 0
+    self.duration_ms = 0.0
+    # (sql, ms) of the queries of the request. Slow requests only record
+    # them once the sampler finds them over the threshold.
+    self.recording = True
+    self.queries: List[Tuple[str, float]] = []
+    # marshalled cProfile stats of sampled requests
+    self.stats: Optional[bytes] = None
+    # Collapsed stacks of slow requests and the number of samples of each
+    self.stacks: Counter[str] = collections.Counter()
+
+  def record_query(self, execute: Callable[..., Any], sql: str, params: Any, many: bool, context: Any) -> Any:
+    # connection.execute_wrapper
+    if not self.recording:
+      return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+      return execute(sql, params, many, context)
+    finally:
+      if len(self.queries) < MAX_QUERIES:
+        self.queries.append((sql, (time.perf_counter() - start) * 1000.0))
+
+  def set_stats(self, profiler: cProfile.Profile) -> None:
+    profiler.create_stats()
+    self.stats = marshal.dumps(profiler.stats)
+
+  def format_stats(self, limit: int = 50) -> str:
+    if self.stats is None:
+      return ''
+    out = io.StringIO()
+    stats = pstats.Stats(_LoadedStats(self.stats), stream=out)  # type: ignore
+    stats.sort_stats('cumulative').print_stats(limit)
+    return out.getvalue()
+
+  def format_stacks(self) -> str:
+    '''The stacks in the collapsed format of flame graph tools.'''
+    return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+  def summary(self) -> Dict[str, Any]:
+    return {
+      'id': self.id,
+      'time': self.time,
+      'method': self.method,
+      'path': self.path,
+      'status': self.status,
+      'duration_ms': round(self.duration_ms, 3),
+      'queries': len(self.queries),
+      'query_ms': round(sum(ms for sql, ms in self.queries), 3),
+      'kind': 'cprofile' if self.stats is not None else 'stacks',
+    }
+
+
+class ProfileStore:
+  '''The last CMS_PROFILE_KEEP profiles of this process.'''
+
+  def __init__(self) -> None:
+    self._lock = threading.Lock()
+    self._ids = itertools.count(1)
+    self._profiles: Deque[Profile] = collections.deque()
+
+  def add(self, profile: Profile) -> None:
+    with self._lock:
+      profile.id = next(self._ids)
+      self._profiles.append(profile)
+      while len(self._profiles) > settings.CMS_PROFILE_KEEP:
+        self._profiles.popleft()
+
+  def get(self, id: int) -> Optional[Profile]:
+    with self._lock:
+      return next((p for p in self._profiles if p.id == id), None)
+
+  def get_all(self) -> List[Profile]:
+    with self._lock:
+      return list(self._profiles)
+
+
+def _collapse(frame: Optional[FrameType]) -> str:
+  names: List[str] = []
+  while frame is not None and len(names) < MAX_STACK_DEPTH:
+    code = frame.f_code
+    names.append(f'{code.co_name} ({code.co_filename}:{frame.f_lineno})')
+    frame = frame.f_back
+  return ';'.join(reversed(names))
+
+
+class StackSampler:
+  '''
+  Samples the stacks of requests once they run longer than
+  CMS_PROFILE_SLOW_MS, from a single background thread. Requests finishing
+  faster cost a dict insert and removal.
+  '''
+
+  def __init__(self) -> None:
+    self._lock = threading.Lock()
+    self._requests: Dict[int, Tuple[float, Profile]] = {}
+    self._thread: Optional[threading.Thread] = None
+
+  def watch(self, profile: Profile) -> None:
+    # Single dict operations are atomic, requests take no lock
+    self._requests[threading.get_ident()] = (time.perf_counter(), profile)
+    if self._thread is None:
+      with self._lock:
+        if self._thread is None:
+          self._thread = threading.Thread(target=self._run, name='cms-stack-sampler', daemon=True)
+          self._thread.start()
+
+  def unwatch(self) -> None:
+    self._requests.pop(threading.get_ident(), None)
+
+  def sample(self) -> None:
+    if settings.CMS_PROFILE_SLOW_MS is None:
+      return
+    slow = settings.CMS_PROFILE_SLOW_MS / 1000.0
+    now = time.perf_counter()
+    slow_requests = [
+      (ident, profile)
+      for ident, (start, profile) in self._requests.copy().items()
+      if now - start >= slow
+    ]
+    if not slow_requests:
+      return
+    frames = sys._current_frames()
+    for ident, profile in slow_requests:
+      profile.recording = True
+      if ident in frames:
+        profile.stacks[_collapse(frames[ident])] += 1
+
+  def _run(self) -> None:
+    while True:
+      time.sleep(settings.CMS_PROFILE_INTERVAL_MS / 1000.0)
+      self.sample()
+
+
+profiles = ProfileStore()
+sampler = StackSampler()
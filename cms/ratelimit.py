@@ -0,0 +1,152 @@
+import collections
+import contextlib
+import threading
+import time
+from typing import Dict, Iterator, Optional, OrderedDict, Tuple, Union
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics
+
+Bucket = Tuple[float, float]
+
+
+class Overloaded(Exception):
+  def __init__(self, name: str, retry_after: int):
+    self.name: str = name
+    self.retry_after: int = retry_after
+
+
+def _refill(bucket: Optional[Bucket], now: float, rate: float, burst: float) -> float:
+  if bucket is None:
+    return burst
+  tokens, updated = bucket
+  return min(burst, tokens + (now - updated) * rate)
+
+
+class LocalBucketStore:
+  '''
+  Token buckets of this process, dropping the least recently used beyond
+  CMS_RATE_LIMIT_LOCAL_KEYS. Those have been idle the longest, so they are
+  the closest to full.
+  '''
+
+  def __init__(self) -> None:
+    self._lock = threading.Lock()
+    self._buckets: OrderedDict[str, Bucket] = collections.OrderedDict()
+
+  def take(self, key: str, rate: float, burst: float) -> float:
+    '''Takes a token, returns 0 on success or the seconds until one is available.'''
+    now = time.monotonic()
+    with self._lock:
+      tokens = _refill(self._buckets.get(key), now, rate, burst)
+      wait = 0.0
+      if tokens >= 1:
+        tokens -= 1
+      else:
+        wait = (1 - tokens) / rate
+      self._buckets[key] = (tokens, now)
+      self._buckets.move_to_end(key)
+      while len(self._buckets) > settings.CMS_RATE_LIMIT_LOCAL_KEYS:
+        self._buckets.popitem(last=False)
+      return wait
+
+  def peek(self, key: str, rate: float, burst: float) -> float:
+    '''Returns 0 if a token is available or the seconds until one is, without taking it.'''
+    with self._lock:
+      tokens = _refill(self._buckets.get(key), time.monotonic(), rate, burst)
+    return 0 if tokens >= 1 else (1 - tokens) / rate
+
+
+class CacheBucketStore:
+  '''
+  Limits shared by all workers through the cache. Rather than a token
+  bucket, which needs a read and a write, each client gets a counter per
+  window of burst / rate seconds, taken by an atomic increment. A client
+  can make burst requests per window, so up to twice that around the start
+  of a window.
+  '''
+
+  def _window(self, key: str, rate: float, burst: float) -> Tuple[str, float, float]:
+    # Returns the key of the counter, the seconds left in the window and its length
+    now = time.time()
+    length = burst / rate
+    window = int(now // length)
+    return f'cms:ratelimit:{key}:{window}', (window + 1) * length - now, length
+
+  def take(self, key: str, rate: float, burst: float) -> float:
+    cache_key, left, length = self._window(key, rate, burst)
+    cache.add(cache_key, 0, int(length) + 1)
+    try:
+      count = cache.incr(cache_key)
+    except ValueError:
+      # Evicted since it was added, this request starts the window again
+      cache.add(cache_key, 1, int(length) + 1)
+      count = 1
+    return 0 if count <= burst else left
+
+  def peek(self, key: str, rate: float, burst: float) -> float:
+    cache_key, left, length = self._window(key, rate, burst)
+    return 0 if cache.get(cache_key, 0) < burst else left
+
+
+class RateLimiter:
+  _stores: Dict[str, Union[LocalBucketStore, CacheBucketStore]] = {
+    'local': LocalBucketStore(),
+    'cache': CacheBucketStore(),
+  }
+
+  @classmethod
+  def take(cls, client: str) -> float:
+    store = settings.CMS_RATE_LIMIT_STORE
+    if store is None:
+      return 0
+    wait = cls._stores[store].take(client, settings.CMS_RATE_LIMIT_RATE, settings.CMS_RATE_LIMIT_BURST)
+    if wait:
+      metrics.increment('ratelimit.rejected')
+    return wait
+
+  @classmethod
+  def peek(cls, client: str) -> float:
+    '''Like take, without using up a token.'''
+    store = settings.CMS_RATE_LIMIT_STORE
+    if store is None:
+      return 0
+    wait = cls._stores[store].peek(client, settings.CMS_RATE_LIMIT_RATE, settings.CMS_RATE_LIMIT_BURST)
+    if wait:
+      metrics.increment('ratelimit.rejected')
+    return wait
+
+
+class ConcurrencyLimiter:
+  '''
+  Caps the number of requests of this process running an expensive
+  operation at once. Requests over the cap fail right away instead of
+  queueing for the database.
+  '''
+  _lock = threading.Lock()
+  _semaphores: Dict[Tuple[str, int], threading.BoundedSemaphore] = {}
+
+  @classmethod
+  def _semaphore(cls, name: str, limit: int) -> threading.BoundedSemaphore:
+    with cls._lock:
+      if (name, limit) not in cls._semaphores:
+        cls._semaphores[(name, limit)] = threading.BoundedSemaphore(limit)
+      return cls._semaphores[(name, limit)]
+
+  @classmethod
+  @contextlib.contextmanager
+  def limit(cls, name: str) -> Iterator[None]:
+    limit = settings.CMS_CONCURRENCY_LIMITS.get(name)
+    if not limit:
+      yield
+      return
+    semaphore = cls._semaphore(name, limit)
+    if not semaphore.acquire(blocking=False):
+      metrics.increment(f'concurrency.rejected.{name}')
+      raise Overloaded(name, settings.CMS_CONCURRENCY_RETRY_AFTER)
+    try:
+      yield
+    finally:
+      semaphore.release()
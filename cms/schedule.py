@@ -0,0 +1,44 @@
+from typing import Optional
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import DEFAULT_SITE, NEVER, Article, timenow
+
+SCHEDULE_CACHE_KEY = 'cms:article:schedule:{}'
+
+
+def next_change(site: int = DEFAULT_SITE) -> int:
+  '''
+  Returns the time (ms) of the next scheduled publication or expiry of an
+  article of the site, NEVER if there is none. Pages of the site listing
+  articles are valid until then.
+  '''
+  now = timenow()
+  cache_key = SCHEDULE_CACHE_KEY.format(site)
+  change: Optional[int] = cache.get(cache_key)
+  if change is None or change <= now:
+    publish = (Article.objects
+               .filter(site=site, publish_at__gt=now)
+               .order_by('publish_at')
+               .values_list('publish_at', flat=True)
+               .first())
+    expire = (Article.objects
+              .filter(site=site, expire_at__gt=now, expire_at__lt=NEVER)
+              .order_by('expire_at')
+              .values_list('expire_at', flat=True)
+              .first())
+    change = min(publish or NEVER, expire or NEVER)
+    cache.set(cache_key, change, None)
+  return change
+
+
+def valid_until(site: int) -> float:
+  '''next_change of the site in seconds, the validity bound of its cached pages.'''
+  return next_change(site) / 1000.0
+
+
+def expire(site: int = DEFAULT_SITE) -> None:
+  cache_key = SCHEDULE_CACHE_KEY.format(site)
+  cache.delete(cache_key)
+  transaction.on_commit(lambda: cache.delete(cache_key))
@@ -0,0 +1,153 @@
+import math
+import random
+from typing import Callable, Dict, Iterator, List, Optional
+
+from django.db import transaction
+
+from . import schedule
+from .cache import drop_site
+from .models import DEFAULT_SITE, Article, ArticleRevision, Category, Task, timenow
+from .services import CategoryService
+
+WORDS = (
+  'lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor '
+  'incididunt ut labore et dolore magna aliqua enim ad minim veniam quis nostrud '
+  'exercitation ullamco laboris nisi aliquip ex ea commodo consequat duis aute irure '
+  'in reprehenderit voluptate velit esse cillum fugiat nulla pariatur excepteur sint '
+  'occaecat cupidatat non proident sunt culpa qui officia deserunt mollit anim id est'
+).split()
+
+YEAR_MS = 365 * 24 * 3600 * 1000
+
+
+class DatasetGenerator:
+  '''
+  Generates a deterministic dataset of a category tree and articles spread
+  over it, written with bulk inserts. The same arguments always produce the
+  same rows, apart from article ids and timestamps relative to the current time.
+  '''
+
+  def __init__(
+      self,
+      author: int,
+      site: int = DEFAULT_SITE,
+      prefix: str = 'seed',
+      seed: int = 0,
+      fanout: int = 4,
+      depth: int = 3,
+      articles: int = 1000,
+      content_size: int = 2000,
+      content_spread: float = 1.0,
+      visible_ratio: float = 0.95,
+      direct_links_ratio: float = 0.05,
+      batch_size: int = 1000,
+      progress: Optional[Callable[[str], None]] = None,
+  ) -> None:
+    self.author = author
+    self.site = site
+    self.prefix = prefix
+    self.rng = random.Random(seed)
+    self.fanout = fanout
+    self.depth = depth
+    self.articles = articles
+    self.content_size = content_size
+    self.content_spread = content_spread
+    self.visible_ratio = visible_ratio
+    self.direct_links_ratio = direct_links_ratio
+    self.batch_size = batch_size
+    self.progress = progress or (lambda message: None)
+    self.now = timenow()
+    # Contents are slices of a shared text, generating words per article is too slow
+    self.text = ' '.join(self.rng.choice(WORDS) for i in range(200000))
+
+  def _content(self) -> str:
+    # Log-normal sizes with content_size as the median
+    size = int(self.content_size * math.exp(self.rng.gauss(0, self.content_spread)))
+    size = max(1, min(size, len(self.text)))
+    start = self.rng.randrange(len(self.text) - size + 1)
+    return self.text[start:start + size]
+
+  def _get_category_ids(self, names: List[str]) -> Dict[str, int]:
+    # Ids of created categories, which bulk inserts do not return on all databases
+    ids: Dict[str, int] = {}
+    for start in range(0, len(names), self.batch_size):
+      ids.update(Category.objects
+                 .filter(site=self.site, name__in=names[start:start + self.batch_size])
+                 .values_list('name', 'id'))
+    return ids
+
+  def _create_categories(self) -> List[int]:
+    ids: List[int] = []
+    level = [(0, self.prefix)]
+    for d in range(self.depth):
+      categories = []
+      for parent, parent_name in level:
+        for i in range(self.fanout if d else 1):
+          name = f'{parent_name}-{i}'
+          categories.append(Category(
+            site=self.site,
+            name=name,
+            long_name=' '.join(self.rng.choice(WORDS) for j in range(3)).title(),
+            parent=parent,
+            ctime=self.now,
+            mtime=self.now,
+          ))
+      for start in range(0, len(categories), self.batch_size):
+        Category.objects.bulk_create(categories[start:start + self.batch_size])
+      level_ids = self._get_category_ids([c.name for c in categories])
+      ids.extend(level_ids[c.name] for c in categories)
+      level = [(level_ids[c.name], c.name) for c in categories]
+    self.progress(f'Created {len(ids)} categories')
+    return ids
+
+  def _generate_articles(self, categories: List[int]) -> Iterator[Article]:
+    for i in range(self.articles):
+      ctime = self.now - int(self.rng.random() * YEAR_MS)
+      yield Article(
+        site=self.site,
+        name=f'{self.prefix}-a{i}',
+        author=self.author,
+        category=self.rng.choice(categories),
+        title=' '.join(self.rng.choice(WORDS) for j in range(6)).capitalize(),
+        content=self._content(),
+        visible=self.rng.random() < self.visible_ratio,
+        direct_links_only=self.rng.random() < self.direct_links_ratio,
+        ctime=ctime,
+        mtime=ctime + int(self.rng.random() * (self.now - ctime)),
+      )
+
+  def clear(self) -> None:
+    '''
+    Deletes the articles and categories of the site with their revisions
+    and queued tasks, and drops its cached pages and feeds.
+    '''
+    articles = Article.objects.filter(site=self.site)
+    with transaction.atomic():
+      ArticleRevision.objects.filter(article__in=articles.values('id')).delete()
+      article_count, _ = articles.delete()
+      category_count, _ = Category.objects.filter(site=self.site).delete()
+      # Follow-up tasks of writes in the site, all of them expire its caches
+      Task.objects.filter(site=self.site).delete()
+      CategoryService._expire_tree(self.site)
+      schedule.expire(self.site)
+    drop_site(self.site)
+    self.progress(f'Deleted {article_count} articles and {category_count} categories')
+
+  def generate(self) -> None:
+    with transaction.atomic():
+      categories = self._create_categories()
+    batch: List[Article] = []
+    created = 0
+    for article in self._generate_articles(categories):
+      batch.append(article)
+      if len(batch) == self.batch_size:
+        Article.objects.bulk_create(batch)
+        created += len(batch)
+        batch = []
+        if created % (self.batch_size * 100) == 0:
+          self.progress(f'Created {created} articles')
+    Article.objects.bulk_create(batch)
+    self.progress(f'Done, created {created + len(batch)} articles')
+    with transaction.atomic():
+      CategoryService.reconcile_counts()
+    CategoryService._expire_tree(self.site)
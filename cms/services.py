@@ -1,11 +1,31 @@
 import datetime
+import hashlib
+import json
 import re
-from typing import List, Optional
+import secrets
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
 
-from django.db.models import QuerySet
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Max, QuerySet
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save
 from django.db.utils import DatabaseError, IntegrityError
+from django.dispatch import receiver
 
-from .models import Article, Category
+from . import delta, schedule
+from .cache import feed_cache, page_cache, site_prefix
+from .models import DEFAULT_SITE, NEVER, ApiToken, Article, ArticleRevision, Category, Site, UserSettings, timenow
+from .tasks import TaskQueue
+
+CATEGORY_TREE_CACHE_KEY = 'cms:category:tree:{}'
+API_TOKEN_CACHE_KEY = 'cms:token:{}'
+USER_SETTINGS_CACHE_KEY = 'cms:usersettings:{}'
+AUTHOR_NAME_CACHE_KEY = 'cms:author:{}'
+SITES_CACHE_KEY = 'cms:sites'
 
 
 class ServiceError(Exception):
@@ -17,6 +37,24 @@ class AlreadyExistsError(ServiceError):
     self.key: str = key
 
 
+class CycleError(ServiceError):
+  def __init__(self, id: int, parent: int):
+    self.id: int = id
+    self.parent: int = parent
+
+
+class SiteMismatchError(ServiceError):
+  def __init__(self, category: int, site: int):
+    self.category: int = category
+    self.site: int = site
+
+
+class InvalidScheduleError(ServiceError):
+  def __init__(self, publish_at: Any, expire_at: Any):
+    self.publish_at: Any = publish_at
+    self.expire_at: Any = expire_at
+
+
 class ServiceBase:
   @classmethod
   def _handle_database_error(cls, e: DatabaseError) -> None:
@@ -36,43 +74,84 @@ class ArticleService(ServiceBase):
       cls,
       range_query: bool = True,
       only_visible: bool = True,
+      site: Optional[int] = DEFAULT_SITE,
+      only_published: bool = True,
   ) -> QuerySet[Article]:
-    q = Article.objects.all()
+    # site None spans all sites
+    q = Article.objects.all() if site is None else Article.objects.filter(site=site)
     if range_query:
       q = q.filter(direct_links_only=False)
     if only_visible:
       q = q.filter(visible=True)
+      # Editors see visible articles outside their publishing window too
+      if only_published:
+        now = timenow()
+        q = q.filter(publish_at__lte=now, expire_at__gt=now)
     return q
 
   @classmethod
-  def get_by_id(cls, id: int) -> Optional[Article]:
+  def get_by_id(cls, id: int, site: int = DEFAULT_SITE, only_published: bool = True) -> Optional[Article]:
     try:
-      return cls._get_base_query(range_query=False).get(id=id, visible=True)
+      return cls._get_base_query(range_query=False, site=site, only_published=only_published).get(id=id)
     except Article.DoesNotExist:
       return None
 
   @classmethod
-  def get_by_name(cls, name: str) -> Optional[Article]:
+  def get_for_edit(cls, id: int, site: int = DEFAULT_SITE) -> Optional[Article]:
+    return cls.get_by_id(id, site, only_published=False)
+
+  @classmethod
+  def get_by_name(cls, name: str, site: int = DEFAULT_SITE, only_published: bool = True) -> Optional[Article]:
     try:
-      return cls._get_base_query(range_query=False).get(name=name)
+      return cls._get_base_query(range_query=False, site=site, only_published=only_published).get(name=name)
     except Article.DoesNotExist:
       return None
 
   @classmethod
-  def get_by_category(cls, category: Category, include_descendants: bool = True) -> List[Article]:
+  def get_by_category(
+      cls, category: Category, include_descendants: bool = True, only_published: bool = True) -> List[Article]:
     categories = set([category.id])
     if include_descendants:
-      prev_categories = set(categories)
-      while prev_categories:
-        result = set(cat.id for cat in Category.objects.filter(parent__in=prev_categories))
-        prev_categories = result.difference(categories)
-        categories.update(prev_categories)
-    return list(cls._get_base_query().filter(category__in=categories))
+      categories = CategoryService._get_descendant_ids(category.id, category.site)
+    return list(cls._get_base_query(site=category.site, only_published=only_published)
+                .filter(category__in=categories))
 
   @classmethod
-  def get_all(cls) -> List[Article]:
+  def get_all(cls, site: int = DEFAULT_SITE, only_published: bool = True) -> List[Article]:
     # TODO: add some filters like start time, limit etc
-    return list(cls._get_base_query())
+    return list(cls._get_base_query(site=site, only_published=only_published))
+
+  @classmethod
+  def _listed_category(cls, article: Article) -> int:
+    # Category whose pages list the article, 0 if it is not listed anywhere
+    if not article.visible or article.direct_links_only:
+      return 0
+    return article.category
+
+  @classmethod
+  def _check_schedule(cls, publish_at: Any, expire_at: Any) -> None:
+    # Times come from API clients as JSON numbers, which must be exact
+    for value in (publish_at, expire_at):
+      if value is not None and (not isinstance(value, int) or isinstance(value, bool) or not 0 <= value <= NEVER):
+        raise InvalidScheduleError(publish_at, expire_at)
+
+  @classmethod
+  def _expire_pages(cls, id: int, name: str, category: int, site: int = DEFAULT_SITE) -> None:
+    chain = CategoryService._get_chain_names(category, site)
+    prefix = site_prefix(site)
+    page_cache.expire(
+      f'{prefix}:index',
+      f'{prefix}:article:{name}',
+      *[f'{prefix}:category:{n}' for n in chain],
+    )
+    feed_cache.expire(
+      f'{prefix}:sitemap:index',
+      f'{prefix}:sitemap:{id // settings.CMS_SITEMAP_CHUNK_SIZE}',
+      # Lists the time of the latest article of each category
+      f'{prefix}:sitemap:categories',
+      f'{prefix}:feed:',
+      *[f'{prefix}:feed:{n}' for n in chain],
+    )
 
   @classmethod
   def create(
@@ -84,8 +163,12 @@ class ArticleService(ServiceBase):
       category: int,
       visible: bool,
       direct_links_only: bool,
+      publish_at: int = 0,
+      expire_at: int = NEVER,
+      site: int = DEFAULT_SITE,
   ) -> Article:
     a = Article(
+      site=site,
       name=name,
       author=author,
       title=title,
@@ -93,9 +176,19 @@ class ArticleService(ServiceBase):
       category=category,
       visible=visible,
       direct_links_only=direct_links_only,
+      publish_at=publish_at,
+      expire_at=expire_at,
     )
+    cls._check_schedule(publish_at, expire_at)
+    CategoryService._check_site(category, site)
     try:
-      a.save()
+      with transaction.atomic():
+        a.save()
+        if a.is_scheduled():
+          schedule.expire(a.site)
+        ArticleRevisionService._record(a, None)
+        CategoryService._move_article_count(0, cls._listed_category(a), a.mtime, a.site)
+        TaskQueue.enqueue('cms.expire_article_pages', id=a.id, name=a.name, category=a.category, site=a.site)
     except DatabaseError as e:
       ServiceBase._handle_database_error(e)
     return a
@@ -111,42 +204,278 @@ class ArticleService(ServiceBase):
       category: int,
       visible: bool,
       direct_links_only: bool,
+      publish_at: Optional[int] = None,
+      expire_at: Optional[int] = None,
   ) -> Article:
-    article.name = name
-    article.title = title
-    article.content = content
-    article.category = category
-    article.visible = visible
-    article.direct_links_only = direct_links_only
-    if author is not None:
-      article.author = author
-    article.mtime = int(datetime.datetime.now().timestamp() * 1000.0)
+    cls._check_schedule(publish_at, expire_at)
     try:
-      article.save()
+      with transaction.atomic():
+        # The stored row, not the caller's copy which may be stale, is what
+        # this write changes. Concurrent writes of the article wait here.
+        current = Article.objects.select_for_update().get(id=article.id)
+        old_name, old_category, old_content = current.name, current.category, current.content
+        old_listed_category = cls._listed_category(current)
+        was_scheduled = current.is_scheduled()
+        if category != old_category:
+          CategoryService._check_site(category, article.site)
+        article.name = name
+        article.title = title
+        article.content = content
+        article.category = category
+        article.visible = visible
+        article.direct_links_only = direct_links_only
+        article.author = current.author if author is None else author
+        article.publish_at = current.publish_at if publish_at is None else publish_at
+        article.expire_at = current.expire_at if expire_at is None else expire_at
+        article.mtime = int(datetime.datetime.now().timestamp() * 1000.0)
+        article.save()
+        if was_scheduled or article.is_scheduled():
+          schedule.expire(article.site)
+        ArticleRevisionService._record(article, old_content)
+        CategoryService._move_article_count(
+          old_listed_category, cls._listed_category(article), article.mtime, article.site)
+        TaskQueue.enqueue(
+          'cms.expire_article_pages', id=article.id, name=old_name, category=old_category, site=article.site)
+        TaskQueue.enqueue(
+          'cms.expire_article_pages', id=article.id, name=article.name, category=article.category, site=article.site)
     except DatabaseError as e:
       ServiceBase._handle_database_error(e)
     return article
 
 
+class ArticleRevisionService(ServiceBase):
+  '''
+  Keeps the history of articles. Every CMS_REVISION_SNAPSHOT_INTERVAL-th
+  revision stores the content in full, the others a delta against the
+  previous revision, so rebuilding any revision reads at most that many rows.
+  '''
+
+  @classmethod
+  def _is_snapshot(cls, number: int) -> bool:
+    return (number - 1) % settings.CMS_REVISION_SNAPSHOT_INTERVAL == 0
+
+  @classmethod
+  def _record(cls, article: Article, previous_content: Optional[str]) -> ArticleRevision:
+    # Callers hold the lock on the article row, so that concurrent writes
+    # do not take the same number
+    last = (ArticleRevision.objects
+            .filter(article=article.id)
+            .aggregate(number=Max('number'))['number'])
+    number = (last or 0) + 1
+    # History of articles created before revisions existed starts with a snapshot
+    snapshot = last is None or previous_content is None or cls._is_snapshot(number)
+    data: Dict[str, Any] = {
+      'fields': {
+        'name': article.name,
+        'title': article.title,
+        'category': article.category,
+        'visible': article.visible,
+        'direct_links_only': article.direct_links_only,
+        'publish_at': article.publish_at,
+        'expire_at': article.expire_at,
+      },
+    }
+    if snapshot:
+      data['content'] = article.content
+    else:
+      data['delta'] = delta.diff(previous_content, article.content)  # type: ignore
+    revision = ArticleRevision(
+      article=article.id,
+      number=number,
+      author=article.author,
+      snapshot=snapshot,
+      data=zlib.compress(json.dumps(data).encode('UTF-8')),
+      ctime=article.mtime,
+      mtime=article.mtime,
+    )
+    revision.save()
+    return revision
+
+  @classmethod
+  def _get_base_query(cls, article_id: int, site: int) -> QuerySet[ArticleRevision]:
+    # Revisions of articles of other sites are not found, without a query of their own
+    return ArticleRevision.objects.filter(
+      article__in=Article.objects.filter(id=article_id, site=site).values('id'))
+
+  @classmethod
+  def get_all(cls, article_id: int, site: int = DEFAULT_SITE) -> List[Dict[str, Any]]:
+    return [
+      {'number': number, 'ctime': ctime, 'author': author, 'snapshot': snapshot}
+      for number, ctime, author, snapshot in (
+        cls._get_base_query(article_id, site)
+        .order_by('number')
+        .values_list('number', 'ctime', 'author', 'snapshot'))
+    ]
+
+  @classmethod
+  def get(cls, article_id: int, number: int, site: int = DEFAULT_SITE) -> Optional[Dict[str, Any]]:
+    '''Rebuilds the article as it was at the given revision.'''
+    # Not derived from CMS_REVISION_SNAPSHOT_INTERVAL, which may have
+    # changed since the revisions were recorded
+    start = (cls._get_base_query(article_id, site)
+             .filter(number__lte=number, snapshot=True)
+             .aggregate(number=Max('number'))['number'])
+    if start is None:
+      return None
+    revisions = list(
+      ArticleRevision.objects
+      .filter(article=article_id, number__gte=start, number__lte=number)
+      .order_by('number'))
+    if revisions[-1].number != number:
+      return None
+    content = ''
+    for revision in revisions:
+      data = json.loads(zlib.decompress(revision.data))
+      content = data['content'] if revision.snapshot else delta.apply(content, data['delta'])
+    result: Dict[str, Any] = {
+      'id': article_id,
+      'revision': number,
+      'author': revisions[-1].author,
+      'ctime': revisions[-1].ctime,
+    }
+    result.update(data['fields'])
+    result['content'] = content
+    return result
+
+
 class CategoryService(ServiceBase):
 
   @classmethod
-  def get_by_id(cls, id: int) -> Optional[Category]:
+  def get_by_id(cls, id: int, site: int = DEFAULT_SITE) -> Optional[Category]:
     try:
-      return Category.objects.get(id=id)
+      return Category.objects.get(id=id, site=site)
     except Category.DoesNotExist:
       return None
 
   @classmethod
-  def get_by_name(cls, name: str) -> Optional[Category]:
+  def get_by_name(cls, name: str, site: int = DEFAULT_SITE) -> Optional[Category]:
     try:
-      return Category.objects.get(name=name)
+      return Category.objects.get(site=site, name=name)
     except Category.DoesNotExist:
       return None
 
   @classmethod
-  def get_all(cls) -> List[Category]:
-    return [a for a in Category.objects.all()]
+  def _check_site(cls, id: int, site: int) -> None:
+    # Articles and categories reference categories of their own site only, 0 is none
+    if id and Category.objects.filter(id=id).exclude(site=site).exists():
+      raise SiteMismatchError(id, site)
+
+  @classmethod
+  def _get_tree(cls, site: int) -> Tuple[Dict[int, int], Dict[int, List[int]]]:
+    # Parents and children of the categories of a site, shared through the
+    # cache so that tree traversals need neither a query per level nor
+    # rebuilding the tree
+    key = CATEGORY_TREE_CACHE_KEY.format(site)
+    tree: Optional[Tuple[Dict[int, int], Dict[int, List[int]]]] = cache.get(key)
+    if tree is None:
+      parents = dict(Category.objects.filter(site=site).values_list('id', 'parent'))
+      children: Dict[int, List[int]] = {}
+      for child, parent in parents.items():
+        children.setdefault(parent, []).append(child)
+      tree = (parents, children)
+      cache.set(key, tree, settings.CMS_CATEGORY_TREE_CACHE_SECONDS)
+    return tree
+
+  @classmethod
+  def _expire_tree(cls, site: int) -> None:
+    key = CATEGORY_TREE_CACHE_KEY.format(site)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+  @classmethod
+  def _get_chain_ids(cls, id: int, site: int) -> List[int]:
+    # The category followed by its ancestors, whose pages list its articles
+    parents = cls._get_tree(site)[0]
+    chain: List[int] = []
+    while id in parents and id not in chain:
+      chain.append(id)
+      id = parents[id]
+    return chain
+
+  @classmethod
+  def _get_descendant_ids(cls, id: int, site: int) -> Set[int]:
+    children = cls._get_tree(site)[1]
+    descendants = set([id])
+    pending = [id]
+    while pending:
+      for child in children.get(pending.pop(), []):
+        if child not in descendants:
+          descendants.add(child)
+          pending.append(child)
+    return descendants
+
+  @classmethod
+  def _get_chain(cls, id: int, site: int) -> List[Category]:
+    ids = cls._get_chain_ids(id, site)
+    categories = Category.objects.in_bulk(ids)
+    return [categories[i] for i in ids if i in categories]
+
+  @classmethod
+  def _get_chain_names(cls, id: int, site: int) -> List[str]:
+    return [c.name for c in cls._get_chain(id, site)]
+
+  @classmethod
+  def get_ancestors(cls, category: Category) -> List[Category]:
+    '''Returns the ancestors of the category, starting from the root.'''
+    return cls._get_chain(category.parent, category.site)[::-1]
+
+  @classmethod
+  def _add_article_count(cls, id: int, delta: int, mtime: int, site: int) -> None:
+    if not id:
+      return
+    chain = cls._get_chain_ids(id, site)
+    if delta:
+      Category.objects.filter(id=id).update(article_count=F('article_count') + delta)
+    Category.objects.filter(id__in=chain).update(
+      total_article_count=F('total_article_count') + delta,
+      latest_article_mtime=Greatest('latest_article_mtime', mtime),
+    )
+
+  @classmethod
+  def _move_article_count(cls, old: int, new: int, mtime: int, site: int) -> None:
+    # old and new are the categories listing the article, 0 if none
+    if old == new:
+      cls._add_article_count(new, 0, mtime, site)
+      return
+    cls._add_article_count(old, -1, 0, site)
+    cls._add_article_count(new, 1, mtime, site)
+
+  @classmethod
+  def reconcile_counts(cls) -> int:
+    '''
+    Recomputes the article counts of all categories from the articles.
+    Returns the number of categories whose counts had drifted.
+    '''
+    direct = {
+      row['category']: (row['count'], row['latest'])
+      # Listed articles whatever their publishing window, as the incremental counts
+      for row in (ArticleService._get_base_query(only_visible=False, site=None)
+                  .filter(visible=True)
+                  .values('category')
+                  .annotate(count=Count('id'), latest=Max('mtime')))
+    }
+    categories = {c.id: c for c in Category.objects.all()}
+    totals = {id: [0, 0] for id in categories}
+    for id in categories:
+      count, latest = direct.get(id, (0, 0))
+      seen = set()
+      while id in categories and id not in seen:
+        seen.add(id)
+        totals[id][0] += count
+        totals[id][1] = max(totals[id][1], latest)
+        id = categories[id].parent
+    changed = []
+    for id, category in categories.items():
+      counts = (direct.get(id, (0, 0))[0], totals[id][0], totals[id][1])
+      if counts != (category.article_count, category.total_article_count, category.latest_article_mtime):
+        category.article_count, category.total_article_count, category.latest_article_mtime = counts
+        changed.append(category)
+    Category.objects.bulk_update(changed, Category.COUNT_FIELDS)
+    return len(changed)
+
+  @classmethod
+  def get_all(cls, site: int = DEFAULT_SITE) -> List[Category]:
+    return [a for a in Category.objects.filter(site=site)]
 
   @classmethod
   def create(
@@ -154,14 +483,19 @@ class CategoryService(ServiceBase):
       name: str,
       long_name: str,
       parent: int,
+      site: int = DEFAULT_SITE,
   ) -> Category:
     a = Category(
+      site=site,
       name=name,
       long_name=long_name,
       parent=parent,
     )
+    cls._check_site(parent, site)
     try:
-      a.save()
+      with transaction.atomic():
+        a.save()
+        cls._expire_tree(site)
     except DatabaseError as e:
       ServiceBase._handle_database_error(e)
     return a
@@ -173,12 +507,206 @@ class CategoryService(ServiceBase):
              long_name: str,
              parent: int,
              ) -> Category:
+    if parent in cls._get_descendant_ids(category.id, category.site):
+      raise CycleError(category.id, parent)
+    if parent != category.parent:
+      cls._check_site(parent, category.site)
+    old_name, old_parent = category.name, category.parent
     category.name = name
     category.long_name = long_name
     category.parent = parent
     category.mtime = int(datetime.datetime.now().timestamp() * 1000.0)
     try:
-      category.save()
+      with transaction.atomic():
+        category.save(update_fields=['name', 'long_name', 'parent', 'mtime'])
+        if parent != old_parent:
+          cls._expire_tree(category.site)
+          category.refresh_from_db(fields=Category.COUNT_FIELDS)
+          cls._reparent_counts(category, old_parent)
+        TaskQueue.enqueue(
+          'cms.expire_category_pages', id=category.id, old_name=old_name, old_parent=old_parent, site=category.site)
     except DatabaseError as e:
       ServiceBase._handle_database_error(e)
     return category
+
+  @classmethod
+  def _reparent_counts(cls, category: Category, old_parent: int) -> None:
+    total = category.total_article_count
+    Category.objects.filter(id__in=cls._get_chain_ids(old_parent, category.site)).update(
+      total_article_count=F('total_article_count') - total,
+    )
+    Category.objects.filter(id__in=cls._get_chain_ids(category.parent, category.site)).update(
+      total_article_count=F('total_article_count') + total,
+      latest_article_mtime=Greatest('latest_article_mtime', category.latest_article_mtime),
+    )
+
+  @classmethod
+  def _expire_pages(cls, id: int, old_name: str, old_parent: int, site: int = DEFAULT_SITE) -> None:
+    names = [old_name] + cls._get_chain_names(old_parent, site) + cls._get_chain_names(id, site)
+    prefix = site_prefix(site)
+    page_cache.expire(*[f'{prefix}:category:{n}' for n in names])
+    feed_cache.expire(f'{prefix}:sitemap:categories', *[f'{prefix}:feed:{n}' for n in names])
+
+
+class SiteService(ServiceBase):
+  @classmethod
+  def get_default(cls) -> Site:
+    return Site(
+      id=DEFAULT_SITE,
+      name='default',
+      domain='',
+      title=settings.CMS_SITE_TITLE,
+      slogan=settings.CMS_SITE_SLOGAN,
+      base_url=settings.CMS_BASE_URL,
+      sidebar=json.dumps(settings.CMS_SITE_SIDEBAR),
+    )
+
+  @classmethod
+  def _get_host_map(cls) -> Dict[str, Site]:
+    # All sites by domain, shared through the cache so that resolving the
+    # site of a request does not need a query
+    sites: Optional[Dict[str, Site]] = cache.get(SITES_CACHE_KEY)
+    if sites is None:
+      sites = {site.domain.lower(): site for site in Site.objects.all()}
+      cache.set(SITES_CACHE_KEY, sites, settings.CMS_SITES_CACHE_SECONDS)
+    return sites
+
+  @classmethod
+  def get_by_host(cls, host: str) -> Site:
+    '''Returns the site served on host, the default site for unknown hosts.'''
+    return cls._get_host_map().get(host.lower()) or cls.get_default()
+
+  @classmethod
+  def get_ids(cls) -> List[int]:
+    return [DEFAULT_SITE] + [site.id for site in cls._get_host_map().values()]
+
+  @classmethod
+  def expire(cls) -> None:
+    cache.delete(SITES_CACHE_KEY)
+    transaction.on_commit(lambda: cache.delete(SITES_CACHE_KEY))
+
+
+class ApiTokenService(ServiceBase):
+  @classmethod
+  def _hash(cls, key: str) -> str:
+    return hashlib.sha256(key.encode('UTF-8')).hexdigest()
+
+  @classmethod
+  def create(cls, userid: int) -> str:
+    '''Creates a token for the user, returns its key. Only the hash of the key is stored.'''
+    key = secrets.token_urlsafe(32)
+    try:
+      ApiToken(userid=userid, key_hash=cls._hash(key)).save()
+    except DatabaseError as e:
+      ServiceBase._handle_database_error(e)
+    return key
+
+  @classmethod
+  def get_user_id(cls, key: str) -> Optional[int]:
+    key_hash = cls._hash(key)
+    cache_key = API_TOKEN_CACHE_KEY.format(key_hash)
+    userid: Optional[int] = cache.get(cache_key)
+    if userid is None:
+      userid = ApiToken.objects.filter(key_hash=key_hash).values_list('userid', flat=True).first()
+      if userid is None:
+        return None
+      cache.set(cache_key, userid, settings.CMS_USER_CACHE_SECONDS)
+    return userid
+
+  @classmethod
+  def delete_for_user(cls, userid: int) -> None:
+    for key_hash in ApiToken.objects.filter(userid=userid).values_list('key_hash', flat=True):
+      cache.delete(API_TOKEN_CACHE_KEY.format(key_hash))
+    ApiToken.objects.filter(userid=userid).delete()
+
+
+class UserSettingsService(ServiceBase):
+  @classmethod
+  def get_by_userid(cls, userid: int) -> Optional[UserSettings]:
+    return cls.get_by_userids([userid]).get(userid)
+
+  @classmethod
+  def get_by_userids(cls, userids: Iterable[int]) -> Dict[int, UserSettings]:
+    '''
+    Returns the settings of the given users, reading through the cache.
+    Users without settings are cached as such and left out of the result.
+    '''
+    keys = {USER_SETTINGS_CACHE_KEY.format(userid): userid for userid in set(userids)}
+    cached: Dict[str, Union[UserSettings, bool]] = cache.get_many(keys.keys())
+    missing = [userid for key, userid in keys.items() if key not in cached]
+    if missing:
+      loaded = {s.userid: s for s in UserSettings.objects.filter(userid__in=missing)}
+      fetched = {
+        USER_SETTINGS_CACHE_KEY.format(userid): loaded.get(userid, False)
+        for userid in missing
+      }
+      cache.set_many(fetched, settings.CMS_USER_CACHE_SECONDS)
+      cached.update(fetched)
+    return {
+      keys[key]: value
+      for key, value in cached.items()
+      if isinstance(value, UserSettings)
+    }
+
+  @classmethod
+  def get_author_names(cls, userids: Iterable[int]) -> Dict[int, str]:
+    '''
+    Returns display names of the given users: the name in their settings,
+    their username otherwise. Takes at most two queries for any number of users.
+    '''
+    keys = {AUTHOR_NAME_CACHE_KEY.format(userid): userid for userid in set(userids)}
+    names = {keys[key]: name for key, name in cache.get_many(keys.keys()).items()}
+    missing = [userid for userid in keys.values() if userid not in names]
+    if missing:
+      fetched = {userid: s.name for userid, s in cls.get_by_userids(missing).items()}
+      without_settings = [userid for userid in missing if userid not in fetched]
+      if without_settings:
+        fetched.update(User.objects.filter(id__in=without_settings).values_list('id', 'username'))
+      cache.set_many(
+        {AUTHOR_NAME_CACHE_KEY.format(userid): name for userid, name in fetched.items()},
+        settings.CMS_USER_CACHE_SECONDS)
+      names.update(fetched)
+    return names
+
+  @classmethod
+  def expire(cls, userid: int) -> None:
+    cache.delete_many([
+      USER_SETTINGS_CACHE_KEY.format(userid),
+      AUTHOR_NAME_CACHE_KEY.format(userid),
+    ])
+    transaction.on_commit(lambda: cache.delete_many([
+      USER_SETTINGS_CACHE_KEY.format(userid),
+      AUTHOR_NAME_CACHE_KEY.format(userid),
+    ]))
+
+  @classmethod
+  def create(cls, userid: int, name: str) -> UserSettings:
+    s = UserSettings(userid=userid, name=name)
+    try:
+      with transaction.atomic():
+        s.save()
+        cls.expire(userid)
+    except DatabaseError as e:
+      ServiceBase._handle_database_error(e)
+    return s
+
+  @classmethod
+  def update(cls, user_settings: UserSettings, name: str) -> UserSettings:
+    user_settings.name = name
+    user_settings.mtime = int(datetime.datetime.now().timestamp() * 1000.0)
+    try:
+      with transaction.atomic():
+        user_settings.save()
+        cls.expire(user_settings.userid)
+    except DatabaseError as e:
+      ServiceBase._handle_database_error(e)
+    return user_settings
+
+
+@receiver([post_save, post_delete], sender=Site)
+def _site_changed(sender: Any, **kwargs: Any) -> None:
+  SiteService.expire()
+
+
+TaskQueue.register('cms.expire_article_pages', ArticleService._expire_pages)
+TaskQueue.register('cms.expire_category_pages', CategoryService._expire_pages)
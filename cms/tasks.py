@@ -0,0 +1,99 @@
+import json
+import logging
+from typing import Any, Callable, Dict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min
+
+from . import metrics
+from .models import DEFAULT_SITE, Task, timenow
+
+logger = logging.getLogger(__name__)
+
+TaskFunction = Callable[..., None]
+
+
+class TaskQueue:
+  '''
+  Queue for follow-up work of writes. With the database queue, tasks are
+  stored in the transaction of the write and run by the runworker command.
+  With the local queue, they run in process once the transaction commits.
+  '''
+  _registry: Dict[str, TaskFunction] = {}
+
+  @classmethod
+  def register(cls, name: str, fn: TaskFunction) -> None:
+    cls._registry[name] = fn
+
+  @classmethod
+  def enqueue(cls, name: str, /, **kwargs: Any) -> None:
+    if name not in cls._registry:
+      raise KeyError(f'Unknown task {name}')
+    metrics.increment('tasks.enqueued')
+    if settings.CMS_TASK_QUEUE == 'local':
+      transaction.on_commit(lambda: cls._execute(name, kwargs))
+      return
+    Task.objects.create(name=name, payload=json.dumps(kwargs), site=kwargs.get('site', DEFAULT_SITE))
+
+  @classmethod
+  def _execute(cls, name: str, kwargs: Dict[str, Any]) -> None:
+    try:
+      cls._registry[name](**kwargs)
+    except Exception:
+      metrics.increment('tasks.failed')
+      logger.exception('Task %s failed', name)
+      return
+    metrics.increment('tasks.succeeded')
+
+  @classmethod
+  def _run(cls, task: Task) -> None:
+    try:
+      with transaction.atomic():
+        cls._registry[task.name](**json.loads(task.payload))
+    except Exception as e:
+      logger.exception('Task %s (%d) failed', task.name, task.id)
+      task.attempts += 1
+      task.last_error = repr(e)
+      task.mtime = timenow()
+      if task.attempts >= settings.CMS_TASK_MAX_ATTEMPTS:
+        task.status = Task.FAILED
+        metrics.increment('tasks.failed')
+      else:
+        task.run_after = task.mtime + 1000 * 2 ** task.attempts
+        metrics.increment('tasks.retried')
+      task.save()
+      return
+    task.delete()
+    metrics.increment('tasks.succeeded')
+
+  @classmethod
+  def run_pending(cls, limit: int = 100) -> int:
+    '''Runs up to limit due tasks, returns the number of tasks processed.'''
+    processed = 0
+    while processed < limit:
+      with transaction.atomic():
+        task = (Task.objects
+                .select_for_update(skip_locked=True)
+                .filter(status=Task.PENDING, run_after__lte=timenow())
+                .order_by('run_after')
+                .first())
+        if task is None:
+          break
+        cls._run(task)
+      processed += 1
+    return processed
+
+  @classmethod
+  def depth(cls) -> Dict[str, int]:
+    '''Returns number of queued tasks per status and the age of the oldest pending one (ms).'''
+    counts = {
+      row['status']: row['count']
+      for row in Task.objects.values('status').annotate(count=Count('id'))
+    }
+    oldest = Task.objects.filter(status=Task.PENDING).aggregate(ctime=Min('ctime'))['ctime']
+    return {
+      'pending': counts.get(Task.PENDING, 0),
+      'failed': counts.get(Task.FAILED, 0),
+      'oldest_pending_age': timenow() - oldest if oldest is not None else 0,
+    }
@@ -1,12 +1,20 @@
+import contextlib
 import datetime
 import inspect
 import json
-from typing import Dict, List, Union, cast
+import time
+from typing import Callable, Dict, Iterator, List, Union, cast
 
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from ..models import Article, Category
+from ..services import CategoryService
+
 ObjectType = Dict[str, Union[str, int, bool]]
 
 
@@ -14,6 +22,7 @@ ObjectType = Dict[str, Union[str, int, bool]]
 class BaseTestCase(TestCase):
   def setUp(self) -> None:
     super().setUp()
+    cache.clear()
     self.client = Client()
     self.creds = {
       'username': 'test',
@@ -21,6 +30,7 @@ class BaseTestCase(TestCase):
     }
     self.user = User.objects.create_user(**self.creds)
     self.maxDiff = None
+    self.seeds = 0
 
   def _name(self, suffix: str = '') -> str:
     for frame in inspect.stack():
@@ -32,6 +42,67 @@ class BaseTestCase(TestCase):
     resp = self.client.post(reverse('cms:login'), self.creds)
     self.assertEqual(resp.status_code, 302)
 
+  @contextlib.contextmanager
+  def _assert_budget(self, max_queries: int, max_seconds: float = 0.5) -> Iterator[CaptureQueriesContext]:
+    with CaptureQueriesContext(connection) as queries:
+      start = time.monotonic()
+      yield queries
+      elapsed = time.monotonic() - start
+    self.assertLessEqual(
+      len(queries), max_queries,
+      '\n'.join(q['sql'] for q in queries.captured_queries))
+    self.assertLess(elapsed, max_seconds)
+
+  def _assert_constant_queries(
+      self,
+      sizes: List[int],
+      request: Callable[[List[Category]], None],
+      max_queries: int,
+      max_seconds: float = 0.5,
+  ) -> None:
+    '''
+    Seeds category chains of the given depths and runs request against each,
+    checking that the number of queries does not grow with the data.
+    '''
+    counts = []
+    for depth in sizes:
+      self.seeds += 1
+      chain = self._seed(self._name(f'-{self.seeds}'), depth)
+      cache.clear()
+      with self._assert_budget(max_queries, max_seconds) as queries:
+        request(chain)
+      counts.append(len(queries))
+    self.assertEqual(len(set(counts)), 1, f'Query counts grow with data: {counts}')
+
+  def _seed(self, prefix: str, depth: int, fanout: int = 2, articles: int = 3) -> List[Category]:
+    '''
+    Creates a category tree with articles in every category.
+    Returns the chain of categories from the root to a deepest leaf.
+    '''
+    chain: List[Category] = []
+    level = [CategoryService.create(f'{prefix}-0', f'{prefix} 0', 0)]
+    for i in range(1, depth):
+      chain.append(level[0])
+      level = [
+        CategoryService.create(f'{parent.name}-{j}', f'{parent.long_name} {j}', parent.id)
+        for parent in level
+        for j in range(fanout)
+      ]
+    chain.append(level[0])
+    Article.objects.bulk_create([
+      Article(
+        name=f'{category.name}-a{i}',
+        author=self.user.id,
+        category=category.id,
+        title=f'{category.long_name} {i}',
+        content=f'{category.long_name} {i}',
+      )
+      for category in Category.objects.filter(name__startswith=prefix)
+      for i in range(articles)
+    ])
+    CategoryService.reconcile_counts()
+    return chain
+
   def _deserialize(self, raw_data: str) -> ObjectType:
     data = json.loads(raw_data)
     return {key: value for key, value in data.items()}
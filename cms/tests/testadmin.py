@@ -0,0 +1,70 @@
+from unittest import mock
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from ..admin import EstimatedCountPaginator
+from ..models import DEFAULT_SITE, Article, Category
+from ..services import CategoryService
+from .base import BaseTestCase
+
+
+class AdminTestCase(BaseTestCase):
+  def setUp(self) -> None:
+    super().setUp()
+    self.user.is_staff = True
+    self.user.is_superuser = True
+    self.user.save()
+    self._login()
+
+  def test_article_list_defers_content(self) -> None:
+    self._seed(self._name(), 2)
+    with CaptureQueriesContext(connection) as queries:
+      resp = self.client.get(reverse('admin:cms_article_changelist'))
+    self.assertEqual(resp.status_code, 200)
+    table = 'FROM ' + connection.ops.quote_name(Article._meta.db_table)
+    selects = [q['sql'] for q in queries.captured_queries if table in q['sql']]
+    self.assertTrue(selects)
+    for sql in selects:
+      self.assertNotIn(connection.ops.quote_name('content'), sql)
+
+  def test_estimated_count(self) -> None:
+    with mock.patch('cms.admin._estimate_rows', return_value=500):
+      with override_settings(CMS_ADMIN_EXACT_COUNT_LIMIT=100):
+        self.assertEqual(EstimatedCountPaginator(Article.objects.all(), 10).count, 500)
+        self.assertEqual(EstimatedCountPaginator(Article.objects.filter(visible=True), 10).count, 0)
+      self.assertEqual(EstimatedCountPaginator(Article.objects.all(), 10).count, 0)
+
+  def test_category_change_goes_through_service(self) -> None:
+    chain = self._seed(self._name(), 3, fanout=1, articles=1)
+    leaf = chain[-1]
+    path = reverse('admin:cms_category_change', args=[leaf.id])
+    resp = self.client.get(path)
+    self.assertContains(resp, chain[1].long_name)
+    data = {'name': leaf.name, 'long_name': leaf.long_name, 'parent': 0}
+    self.assertEqual(self.client.post(path, data).status_code, 302)
+    self.assertEqual(Category.objects.get(id=chain[0].id).total_article_count, 2)
+
+  def test_category_cycle_rejected(self) -> None:
+    chain = self._seed(self._name(), 2, fanout=1)
+    root = chain[0]
+    data = {'name': root.name, 'long_name': root.long_name, 'parent': chain[1].id}
+    resp = self.client.post(reverse('admin:cms_category_change', args=[root.id]), data)
+    self.assertEqual(resp.status_code, 200)
+    self.assertEqual(Category.objects.get(id=root.id).parent, 0)
+
+  def test_category_of_other_site_rejected(self) -> None:
+    other = CategoryService.create(self._name(), self._name(), 0, site=DEFAULT_SITE + 1)
+    root = self._seed(self._name(), 1)[0]
+    data = {'name': root.name, 'long_name': root.long_name, 'parent': other.id}
+    resp = self.client.post(reverse('admin:cms_category_change', args=[root.id]), data)
+    self.assertContains(resp, 'another site')
+    self.assertEqual(Category.objects.get(id=root.id).parent, 0)
+
+  def test_category_invalid_parent(self) -> None:
+    root = self._seed(self._name(), 1)[0]
+    data = {'name': root.name, 'long_name': root.long_name, 'parent': 'abc'}
+    resp = self.client.post(reverse('admin:cms_category_change', args=[root.id]), data)
+    self.assertEqual(resp.status_code, 200)
+    self.assertContains(resp, 'abc')
@@ -0,0 +1,132 @@
+import threading
+import time
+from typing import List, Optional
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from ..cache import SITE_GENERATION_CACHE_KEY, PageCache, SingleFlight, drop_site, site_prefix
+from ..tasks import TaskQueue
+from .base import BaseTestCase
+
+
+class SingleFlightTestCase(SimpleTestCase):
+  def test_concurrent_calls_share_result(self) -> None:
+    flight: SingleFlight[int] = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls: List[int] = []
+    results: List[int] = []
+
+    def slow() -> int:
+      calls.append(1)
+      started.set()
+      release.wait()
+      return 42
+
+    leader = threading.Thread(target=lambda: results.append(flight.do('key', slow)))
+    leader.start()
+    started.wait()
+    followers = [
+      threading.Thread(target=lambda: results.append(flight.do('key', slow)))
+      for i in range(5)
+    ]
+    for follower in followers:
+      follower.start()
+    release.set()
+    for thread in [leader] + followers:
+      thread.join()
+    self.assertEqual(len(calls), 1)
+    self.assertEqual(results, [42] * 6)
+
+  def test_error_is_not_cached(self) -> None:
+    flight: SingleFlight[int] = SingleFlight()
+
+    def fail() -> int:
+      raise ValueError()
+
+    with self.assertRaises(ValueError):
+      flight.do('key', fail)
+    self.assertEqual(flight.do('key', lambda: 1), 1)
+
+
+class PageCacheTestCase(SimpleTestCase):
+  def setUp(self) -> None:
+    super().setUp()
+    cache.clear()
+    self.pages = PageCache(self.id())
+    self.renders: List[str] = []
+
+  def _render(self, body: Optional[str]) -> Optional[str]:
+    self.renders.append(str(body))
+    return body
+
+  def test_fresh_hit(self) -> None:
+    self.assertEqual(self.pages.get('a', lambda: self._render('v1')), 'v1')
+    self.assertEqual(self.pages.get('a', lambda: self._render('v2')), 'v1')
+    self.assertEqual(self.renders, ['v1'])
+
+  def test_missing_page_not_cached(self) -> None:
+    self.assertIsNone(self.pages.get('a', lambda: self._render(None)))
+    self.assertEqual(self.pages.get('a', lambda: self._render('v1')), 'v1')
+
+  def test_stale_served_while_refreshing(self) -> None:
+    self.pages.get('a', lambda: self._render('v1'))
+    self.pages.expire('a')
+    lock_key = self.pages._key('a') + ':refresh'
+    cache.add(lock_key, True)
+    self.assertEqual(self.pages.get('a', lambda: self._render('v2')), 'v1')
+    cache.delete(lock_key)
+    self.assertEqual(self.pages.get('a', lambda: self._render('v2')), 'v2')
+    self.assertEqual(self.renders, ['v1', 'v2'])
+
+  @override_settings(CMS_PAGE_CACHE_FRESH_SECONDS=0)
+  def test_refresh_after_fresh_window(self) -> None:
+    self.pages.get('a', lambda: self._render('v1'))
+    self.assertEqual(self.pages.get('a', lambda: self._render('v2')), 'v2')
+
+
+class SitePrefixTestCase(SimpleTestCase):
+  def setUp(self) -> None:
+    super().setUp()
+    cache.clear()
+
+  def test_drop_site(self) -> None:
+    first, other = site_prefix(1), site_prefix(2)
+    self.assertEqual(site_prefix(1), first)
+    drop_site(1)
+    self.assertNotEqual(site_prefix(1), first)
+    self.assertEqual(site_prefix(2), other)
+
+  def test_evicted_generation_not_reused(self) -> None:
+    first = site_prefix(1)
+    drop_site(1)
+    dropped = site_prefix(1)
+    cache.delete(SITE_GENERATION_CACHE_KEY.format(1))
+    with mock.patch('cms.cache.time.time', return_value=time.time() + 1):
+      self.assertNotIn(site_prefix(1), (first, dropped))
+
+
+class CachedPageTestCase(BaseTestCase):
+  def test_article_update_refreshes_page(self) -> None:
+    self._login()
+    article = self._create_object(reverse('cms:api:article'), {
+      'name': 'cached',
+      'title': 'title',
+      'content': 'first content',
+      'category': 0,
+      'visible': True,
+      'direct_links_only': False,
+    })
+    path = reverse('cms:article', args=['cached'])
+    self.assertContains(self.client.get(path), 'first content')
+    article['content'] = 'second content'
+    self._update_object(reverse('cms:api:article'), article)
+    TaskQueue.run_pending()
+    self.assertContains(self.client.get(path), 'second content')
+    article['name'] = 'renamed'
+    self._update_object(reverse('cms:api:article'), article)
+    TaskQueue.run_pending()
+    self.assertEqual(self.client.get(path).status_code, 404)
@@ -1,6 +1,8 @@
+from typing import List, Tuple
 from django.urls import reverse
 import datetime
 from ..models import Category
+from ..services import CategoryService
 from .base import RestTestMixin, BaseTestCase, ObjectType
 
 class CategoryTestCase(BaseTestCase, RestTestMixin):
@@ -16,3 +18,94 @@ class CategoryTestCase(BaseTestCase, RestTestMixin):
   def _modify(self, data: ObjectType) -> None:
     for key in ['name', 'long_name']:
       data[key] = f'{data[key]}_modified'
+
+  def _create_article(self, category: int, index: int, visible: bool = True) -> ObjectType:
+    return self._create_object(reverse('cms:api:article'), {
+      'name': self._name(f'-article-{index}'),
+      'title': 'title',
+      'content': 'content',
+      'category': category,
+      'visible': visible,
+      'direct_links_only': False,
+    })
+
+  def _counts(self, category: ObjectType) -> Tuple[int, int]:
+    readback = self._get_object(self.rest_path, category['id'])
+    return readback['article_count'], readback['total_article_count']
+
+  def test_article_counts(self) -> None:
+    self._login()
+    root = self._create_object(self.rest_path, self._construct(0))
+    child = self._create_object(self.rest_path, dict(self._construct(1), parent=root['id']))
+    self._create_article(root['id'], 0)
+    article = self._create_article(child['id'], 1)
+    self._create_article(child['id'], 2, visible=False)
+    self.assertEqual(self._counts(root), (1, 2))
+    self.assertEqual(self._counts(child), (1, 1))
+    self.assertEqual(
+      self._get_object(self.rest_path, root['id'])['latest_article_mtime'],
+      article['mtime'])
+
+    article['category'] = root['id']
+    self._update_object(reverse('cms:api:article'), article)
+    self.assertEqual(self._counts(root), (2, 2))
+    self.assertEqual(self._counts(child), (0, 0))
+
+    article['visible'] = False
+    self._update_object(reverse('cms:api:article'), article)
+    self.assertEqual(self._counts(root), (1, 1))
+
+  def test_article_counts_reparent(self) -> None:
+    self._login()
+    first = self._create_object(self.rest_path, self._construct(0))
+    second = self._create_object(self.rest_path, self._construct(1))
+    child = self._create_object(self.rest_path, dict(self._construct(2), parent=first['id']))
+    self._create_article(child['id'], 0)
+    self._create_article(child['id'], 1)
+    child['parent'] = second['id']
+    updated = self._update_object(self.rest_path, child)
+    self.assertEqual(updated['total_article_count'], 2)
+    self.assertEqual(self._counts(first), (0, 0))
+    self.assertEqual(self._counts(second), (0, 2))
+
+  def test_reconcile_counts(self) -> None:
+    self._login()
+    root = self._create_object(self.rest_path, self._construct(0))
+    child = self._create_object(self.rest_path, dict(self._construct(1), parent=root['id']))
+    self._create_article(child['id'], 0)
+    self.assertEqual(CategoryService.reconcile_counts(), 0)
+    Category.objects.update(article_count=5, total_article_count=7)
+    self.assertEqual(CategoryService.reconcile_counts(), 2)
+    self.assertEqual(self._counts(root), (0, 1))
+    self.assertEqual(self._counts(child), (1, 1))
+
+  def _create_chain(self, length: int) -> List[ObjectType]:
+    chain: List[ObjectType] = []
+    for i in range(length):
+      parent = chain[-1]['id'] if chain else 0
+      chain.append(self._create_object(self.rest_path, dict(self._construct(i), parent=parent)))
+    return chain
+
+  def test_ancestors(self) -> None:
+    self._login()
+    chain = self._create_chain(4)
+    resp = self.client.get(f'{self.rest_path}?id={chain[-1]["id"]}&ancestors')
+    self.assertEqual(resp.status_code, 200)
+    ancestors = self._deserialize(resp.content.decode('UTF-8'))['ancestors']
+    self.assertEqual([a['id'] for a in ancestors], [c['id'] for c in chain[:-1]])  # type: ignore
+
+  def test_update_cycle(self) -> None:
+    self._login()
+    chain = self._create_chain(3)
+    chain[0]['parent'] = chain[2]['id']
+    self._update_object(self.rest_path, chain[0], 400)
+    chain[1]['parent'] = chain[1]['id']
+    self._update_object(self.rest_path, chain[1], 400)
+    self.assertEqual(self._get_object(self.rest_path, chain[0]['id'])['parent'], 0)
+
+  def test_breadcrumbs(self) -> None:
+    self._login()
+    chain = self._create_chain(3)
+    resp = self.client.get(reverse('cms:category', args=[chain[-1]['name']]))
+    for category in chain:
+      self.assertContains(resp, reverse('cms:category', args=[category['name']]))
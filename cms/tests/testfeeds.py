@@ -0,0 +1,87 @@
+from typing import Optional, Set
+from xml.etree import ElementTree
+
+from django.test import override_settings
+from django.urls import reverse
+
+from ..feeds import ATOM_NS, SITEMAP_NS
+from ..models import Category
+from ..tasks import TaskQueue
+from .base import BaseTestCase
+
+
+@override_settings(CMS_SITEMAP_CHUNK_SIZE=4, CMS_BASE_URL='http://example.com')
+class FeedsTestCase(BaseTestCase):
+  def _xml(self, path: str) -> ElementTree.Element:
+    resp = self.client.get(path)
+    self.assertEqual(resp.status_code, 200)
+    return ElementTree.fromstring(resp.content)
+
+  def _sitemap_urls(self) -> Set[Optional[str]]:
+    urls: Set[Optional[str]] = set()
+    index = self._xml(reverse('cms:sitemap'))
+    for loc in index.iter(f'{{{SITEMAP_NS}}}loc'):
+      chunk = self._xml(loc.text[len('http://example.com'):])  # type: ignore
+      urls.update(u.text for u in chunk.iter(f'{{{SITEMAP_NS}}}loc'))
+    return urls
+
+  def test_sitemap(self) -> None:
+    chain = self._seed(self._name(), 2, fanout=2, articles=3)
+    urls = self._sitemap_urls()
+    self.assertEqual(len(urls), 3 + 3 * 3)
+    self.assertIn(f'http://example.com/a/{chain[-1].name}-a0', urls)
+    self.assertIn(f'http://example.com/c/{chain[0].name}', urls)
+    missing = reverse('cms:sitemap_chunk', args=[1000])
+    self.assertEqual(self.client.get(missing).status_code, 404)
+
+  def test_sitemap_updated_on_write(self) -> None:
+    self._seed(self._name(), 1)
+    before = self._sitemap_urls()
+    self._login()
+    self._create_object(reverse('cms:api:article'), {
+      'name': 'new-article',
+      'title': 'title',
+      'content': 'content',
+      'category': 0,
+      'visible': True,
+      'direct_links_only': True,
+    })
+    TaskQueue.run_pending()
+    self.assertEqual(self._sitemap_urls() - before, {'http://example.com/a/new-article'})
+
+  def test_category_sitemap_updated_on_write(self) -> None:
+    category = self._seed(self._name(), 1)[0]
+    Category.objects.filter(id=category.id).update(mtime=1000, latest_article_mtime=1000)
+    path = reverse('cms:sitemap_categories')
+
+    def lastmod() -> Optional[str]:
+      return self._xml(path).findtext(f'{{{SITEMAP_NS}}}url/{{{SITEMAP_NS}}}lastmod')
+
+    self.assertEqual(lastmod(), '1970-01-01T00:00:01+00:00')
+    self._login()
+    self._create_object(reverse('cms:api:article'), {
+      'name': 'new-article',
+      'title': 'title',
+      'content': 'content',
+      'category': category.id,
+      'visible': True,
+      'direct_links_only': False,
+    })
+    TaskQueue.run_pending()
+    self.assertNotEqual(lastmod(), '1970-01-01T00:00:01+00:00')
+
+  def test_category_feed(self) -> None:
+    chain = self._seed(self._name(), 3, fanout=1, articles=2)
+    feed = self._xml(reverse('cms:category_feed', args=[chain[1].name]))
+    entries = feed.findall(f'{{{ATOM_NS}}}entry')
+    self.assertEqual(len(entries), 4)
+    for entry in entries:
+      self.assertEqual(entry.findtext(f'{{{ATOM_NS}}}author/{{{ATOM_NS}}}name'), self.user.username)
+    self.assertIsNotNone(feed.find(f'{{{ATOM_NS}}}author/{{{ATOM_NS}}}name'))
+    self.assertEqual(self.client.get(reverse('cms:category_feed', args=['missing'])).status_code, 404)
+
+  @override_settings(CMS_FEED_SIZE=5)
+  def test_feed_size(self) -> None:
+    self._seed(self._name(), 2, fanout=3, articles=3)
+    feed = self._xml(reverse('cms:feed'))
+    self.assertEqual(len(feed.findall(f'{{{ATOM_NS}}}entry')), 5)
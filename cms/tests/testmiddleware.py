@@ -0,0 +1,96 @@
+from typing import List
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import ApiToken
+from ..services import ApiTokenService
+from .base import BaseTestCase, ObjectType
+
+
+class FastPathTestCase(BaseTestCase):
+  def test_public_read_skips_session(self) -> None:
+    self._seed(self._name(), 1)
+    resp = self.client.get(reverse('cms:index'))
+    self.assertEqual(resp.status_code, 200)
+    self.assertFalse(hasattr(resp.wsgi_request, 'session'))
+    self.assertFalse(hasattr(resp.wsgi_request, 'user'))
+
+  def test_api_keeps_session(self) -> None:
+    self._login()
+    resp = self.client.get(reverse('cms:api:article'))
+    self.assertEqual(resp.status_code, 200)
+    self.assertTrue(resp.wsgi_request.user.is_authenticated)
+
+  def test_write_to_public_path_keeps_session(self) -> None:
+    resp = self.client.post(reverse('cms:index'))
+    self.assertTrue(hasattr(resp.wsgi_request, 'session'))
+
+  @override_settings(CMS_FAST_PATH=False)
+  def test_disabled(self) -> None:
+    resp = self.client.get(reverse('cms:index'))
+    self.assertTrue(hasattr(resp.wsgi_request, 'session'))
+
+
+class TokenAuthenticationTestCase(BaseTestCase):
+  def _article(self) -> ObjectType:
+    return {
+      'name': self._name(),
+      'title': 'title',
+      'content': 'content',
+      'category': 0,
+      'visible': True,
+      'direct_links_only': False,
+    }
+
+  def test_token(self) -> None:
+    key = ApiTokenService.create(self.user.id)
+    resp = self.client.post(
+      reverse('cms:api:article'), self._article(),
+      content_type='application/json', HTTP_AUTHORIZATION=f'Token {key}')
+    self.assertEqual(resp.status_code, 200)
+    self.assertEqual(self._deserialize(resp.content.decode('UTF-8'))['author'], self.user.id)
+    self.assertFalse(hasattr(resp.wsgi_request, 'session'))
+
+  def test_invalid_token(self) -> None:
+    resp = self.client.post(
+      reverse('cms:api:article'), self._article(),
+      content_type='application/json', HTTP_AUTHORIZATION='Token invalid')
+    self.assertEqual(resp.status_code, 403)
+
+  def test_revoked_token(self) -> None:
+    key = ApiTokenService.create(self.user.id)
+    ApiTokenService.delete_for_user(self.user.id)
+    resp = self.client.get(reverse('cms:api:article'), HTTP_AUTHORIZATION=f'Token {key}')
+    self.assertEqual(resp.status_code, 403)
+
+  def test_deleted_user(self) -> None:
+    key = ApiTokenService.create(self.user.id)
+    resp = self.client.get(reverse('cms:api:article'), HTTP_AUTHORIZATION=f'Token {key}')
+    self.assertEqual(resp.status_code, 200)
+    self.user.delete()
+    self.assertFalse(ApiToken.objects.exists())
+    resp = self.client.get(reverse('cms:api:article'), HTTP_AUTHORIZATION=f'Token {key}')
+    self.assertEqual(resp.status_code, 403)
+
+
+class CachedUserTestCase(BaseTestCase):
+  def _user_queries(self, expected_code: int = 200) -> List[str]:
+    with CaptureQueriesContext(connection) as queries:
+      resp = self.client.delete(reverse('cms:api:category'))
+    self.assertEqual(resp.status_code, expected_code)
+    return [q['sql'] for q in queries.captured_queries if 'auth_user' in q['sql']]
+
+  def test_user_cached(self) -> None:
+    self._login()
+    self._user_queries()
+    self.assertEqual(self._user_queries(), [])
+
+  def test_password_change(self) -> None:
+    self._login()
+    self._user_queries()
+    self.user.set_password('other')
+    self.user.save()
+    self.assertNotEqual(self._user_queries(403), [])
@@ -0,0 +1,81 @@
+import json
+from typing import List
+
+from django.urls import reverse
+
+from ..models import Category
+from .base import BaseTestCase
+
+SIZES = [3, 5, 7]
+# On a cold cache, every request loads the sites and cached pages look up
+# the next scheduled publication and expiry
+SITE_QUERIES = 1
+SCHEDULE_QUERIES = 2
+# Writes moving an object to another category check the site of the category
+CATEGORY_SITE_QUERIES = 1
+
+
+class QueryBudgetTestCase(BaseTestCase):
+  def _get(self, path: str) -> None:
+    self.assertEqual(self.client.get(path).status_code, 200)
+
+  def test_index(self) -> None:
+    self._assert_constant_queries(
+      SIZES, lambda chain: self._get(reverse('cms:index')), 3 + SITE_QUERIES + SCHEDULE_QUERIES)
+
+  def test_article_page(self) -> None:
+    self._assert_constant_queries(
+      SIZES,
+      lambda chain: self._get(reverse('cms:article', args=[f'{chain[-1].name}-a0'])),
+      6 + SITE_QUERIES + SCHEDULE_QUERIES)
+
+  def test_category_page(self) -> None:
+    for position in [0, -1]:
+      self._assert_constant_queries(
+        SIZES,
+        lambda chain: self._get(reverse('cms:category', args=[chain[position].name])),
+        6 + SITE_QUERIES + SCHEDULE_QUERIES)
+
+  def test_article_api(self) -> None:
+    path = reverse('cms:api:article')
+    self._assert_constant_queries(SIZES, lambda chain: self._get(path), 1 + SITE_QUERIES)
+    self._assert_constant_queries(
+      SIZES, lambda chain: self._get(f'{path}?name={chain[-1].name}-a0'), 1 + SITE_QUERIES)
+    self._assert_constant_queries(
+      SIZES, lambda chain: self._get(f'{path}?category={chain[0].name}&descendants'), 3 + SITE_QUERIES)
+
+  def test_category_api(self) -> None:
+    path = reverse('cms:api:category')
+    self._assert_constant_queries(SIZES, lambda chain: self._get(path), 1 + SITE_QUERIES)
+    self._assert_constant_queries(
+      SIZES, lambda chain: self._get(f'{path}?id={chain[-1].id}&ancestors'), 3 + SITE_QUERIES)
+
+  def test_feeds(self) -> None:
+    self._assert_constant_queries(
+      SIZES, lambda chain: self._get(reverse('cms:sitemap_chunk', args=[0])),
+      2 + SITE_QUERIES + SCHEDULE_QUERIES)
+    self._assert_constant_queries(
+      SIZES, lambda chain: self._get(reverse('cms:category_feed', args=[chain[0].name])),
+      5 + SITE_QUERIES + SCHEDULE_QUERIES)
+
+  def test_article_update(self) -> None:
+    self._login()
+    path = reverse('cms:api:article')
+
+    def update(chain: List[Category]) -> None:
+      data = json.loads(self.client.get(f'{path}?name={chain[-1].name}-a0').content)
+      data['category'] = chain[0].id
+      self._update_object(path, data)
+
+    self._assert_constant_queries(SIZES, update, 17 + SITE_QUERIES + CATEGORY_SITE_QUERIES)
+
+  def test_category_update(self) -> None:
+    self._login()
+    path = reverse('cms:api:category')
+
+    def update(chain: List[Category]) -> None:
+      data = self._get_object(path, chain[-1].id)
+      data['parent'] = chain[0].id
+      self._update_object(path, data)
+
+    self._assert_constant_queries(SIZES, update, 13 + SITE_QUERIES + CATEGORY_SITE_QUERIES)
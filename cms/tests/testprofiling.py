@@ -0,0 +1,106 @@
+import json
+import marshal
+import threading
+
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from ..profiling import Profile, StackSampler, profiles
+from .base import BaseTestCase
+
+
+class ProfilingTestCase(BaseTestCase):
+  def _staff_login(self) -> None:
+    self.user.is_staff = True
+    self.user.save()
+    self._login()
+
+  def _last_id(self) -> int:
+    return max([p.id for p in profiles.get_all()], default=0)
+
+  def test_disabled(self) -> None:
+    last = self._last_id()
+    self.client.get(reverse('cms:index'))
+    self.assertEqual(self._last_id(), last)
+
+  @override_settings(CMS_PROFILE=True, CMS_PROFILE_SAMPLE_RATE=1.0, CMS_PROFILE_SLOW_MS=None)
+  def test_sampled(self) -> None:
+    self._seed(self._name(), 1)
+    self._staff_login()
+    self.client.get(reverse('cms:category', args=[f'{self._name()}-0']))
+    profile = profiles.get(self._last_id())
+    assert profile is not None
+    self.assertEqual(profile.path, reverse('cms:category', args=[f'{self._name()}-0']))
+    self.assertEqual(profile.summary()['kind'], 'cprofile')
+    self.assertTrue(any('cms_article' in sql for sql, ms in profile.queries))
+
+    resp = self.client.get(reverse('cms:api:profiles'), {'id': profile.id})
+    data = json.loads(resp.content)
+    self.assertIn('_render_category', data['stats'])
+    self.assertEqual(len(data['sql']), len(profile.queries))
+    resp = self.client.get(reverse('cms:api:profiles'), {'id': profile.id, 'download': ''})
+    self.assertTrue(marshal.loads(resp.content))
+
+  @override_settings(CMS_PROFILE=True, CMS_PROFILE_SAMPLE_RATE=0.0, CMS_PROFILE_SLOW_MS=0)
+  def test_slow(self) -> None:
+    self.client.get(reverse('cms:index'))
+    profile = profiles.get(self._last_id())
+    assert profile is not None
+    self.assertEqual(profile.summary()['kind'], 'stacks')
+    self.assertIsNone(profile.stats)
+
+  @override_settings(CMS_PROFILE=True, CMS_PROFILE_SAMPLE_RATE=0.0, CMS_PROFILE_SLOW_MS=None)
+  def test_unsampled(self) -> None:
+    last = self._last_id()
+    self.client.get(reverse('cms:index'))
+    self.assertEqual(self._last_id(), last)
+
+  @override_settings(CMS_PROFILE_KEEP=2)
+  def test_ring_buffer(self) -> None:
+    for i in range(3):
+      profiles.add(Profile('GET', f'/{i}'))
+    self.assertEqual([p.path for p in profiles.get_all()], ['/1', '/2'])
+
+  def test_staff_only(self) -> None:
+    self._login()
+    self.assertEqual(self.client.get(reverse('cms:api:profiles')).status_code, 403)
+    self.user.is_staff = True
+    self.user.save()
+    self.assertEqual(self.client.get(reverse('cms:api:profiles')).status_code, 200)
+    self.assertEqual(self.client.get(reverse('cms:api:profiles'), {'id': 0}).status_code, 404)
+
+
+class StackSamplerTestCase(SimpleTestCase):
+  def test_records_queries_once_slow(self) -> None:
+    profile = Profile('GET', '/')
+    profile.recording = False
+    profile.record_query(lambda *args: None, 'SELECT 1', None, False, {})
+    self.assertEqual(profile.queries, [])
+    profile.recording = True
+    profile.record_query(lambda *args: None, 'SELECT 2', None, False, {})
+    self.assertEqual([sql for sql, ms in profile.queries], ['SELECT 2'])
+
+  @override_settings(CMS_PROFILE_SLOW_MS=0, CMS_PROFILE_INTERVAL_MS=3600000)
+  def test_samples_slow_requests(self) -> None:
+    sampler = StackSampler()
+    profile = Profile('GET', '/')
+    profile.recording = False
+    watched, release = threading.Event(), threading.Event()
+
+    def slow_request() -> None:
+      sampler.watch(profile)
+      watched.set()
+      release.wait()
+      sampler.unwatch()
+
+    thread = threading.Thread(target=slow_request)
+    thread.start()
+    watched.wait()
+    sampler.sample()
+    sampler.sample()
+    release.set()
+    thread.join()
+    sampler.sample()
+    self.assertEqual(sum(profile.stacks.values()), 2)
+    self.assertTrue(profile.recording)
+    self.assertIn('slow_request', profile.format_stacks())
@@ -0,0 +1,151 @@
+import threading
+from typing import List, Optional
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from .. import metrics
+from ..cache import PageCache
+from ..ratelimit import CacheBucketStore, ConcurrencyLimiter, LocalBucketStore, Overloaded
+from .base import BaseTestCase
+
+
+class BucketStoreTestCase(SimpleTestCase):
+  def _test_store(self, store: object, max_wait: float) -> None:
+    for i in range(3):
+      self.assertEqual(store.take('client', 1.0, 3.0), 0)  # type: ignore
+    self.assertGreater(store.peek('client', 1.0, 3.0), 0)  # type: ignore
+    wait = store.take('client', 1.0, 3.0)  # type: ignore
+    self.assertGreater(wait, 0)
+    self.assertLessEqual(wait, max_wait)
+    self.assertEqual(store.take('other', 1.0, 3.0), 0)  # type: ignore
+
+  def test_local(self) -> None:
+    self._test_store(LocalBucketStore(), 1)
+
+  def test_cache(self) -> None:
+    cache.clear()
+    # Start of a window of 3 seconds, so that all takes fall in it
+    with mock.patch('cms.ratelimit.time.time', return_value=3000.0):
+      self._test_store(CacheBucketStore(), 3)
+    with mock.patch('cms.ratelimit.time.time', return_value=3003.0):
+      self.assertEqual(CacheBucketStore().take('client', 1.0, 3.0), 0)
+
+  def test_cache_concurrent(self) -> None:
+    cache.clear()
+    store = CacheBucketStore()
+    waits: List[float] = []
+    barrier = threading.Barrier(8)
+
+    def take() -> None:
+      barrier.wait()
+      for i in range(10):
+        waits.append(store.take('client', 0.01, 20.0))
+
+    threads = [threading.Thread(target=take) for i in range(8)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    self.assertEqual(waits.count(0), 20)
+
+  @override_settings(CMS_RATE_LIMIT_LOCAL_KEYS=2)
+  def test_local_drops_least_recently_used(self) -> None:
+    store = LocalBucketStore()
+    store.take('client0', 0.01, 1.0)
+    for i in range(1, 5):
+      store.take('client0', 0.01, 1.0)
+      store.take(f'client{i}', 0.01, 1.0)
+    self.assertEqual(list(store._buckets), ['client0', 'client4'])
+
+
+class RateLimitTestCase(BaseTestCase):
+  @override_settings(CMS_RATE_LIMIT_STORE='cache', CMS_RATE_LIMIT_RATE=0.01, CMS_RATE_LIMIT_BURST=2.0)
+  def test_over_limit(self) -> None:
+    rejected = metrics.snapshot().get('ratelimit.rejected', 0)
+    address = {'REMOTE_ADDR': '10.0.0.1'}
+    for i in range(2):
+      self.assertEqual(self.client.get(reverse('cms:index'), **address).status_code, 200)
+    resp = self.client.get(reverse('cms:index'), **address)
+    self.assertEqual(resp.status_code, 429)
+    self.assertGreater(int(resp['Retry-After']), 0)
+    self.assertEqual(metrics.snapshot()['ratelimit.rejected'], rejected + 1)
+    self.assertEqual(self.client.get(reverse('cms:index'), REMOTE_ADDR='10.0.0.2').status_code, 200)
+
+  @override_settings(CMS_RATE_LIMIT_STORE='cache', CMS_RATE_LIMIT_RATE=0.01, CMS_RATE_LIMIT_BURST=2.0)
+  def test_invalid_tokens(self) -> None:
+    address = {'REMOTE_ADDR': '10.0.0.5', 'HTTP_AUTHORIZATION': 'Token invalid'}
+    for i in range(2):
+      self.assertEqual(self.client.get(reverse('cms:api:article'), **address).status_code, 403)
+    with self.assertNumQueries(0):
+      resp = self.client.get(reverse('cms:api:article'), **address)
+    self.assertEqual(resp.status_code, 429)
+    self.assertEqual(self.client.get(reverse('cms:index'), REMOTE_ADDR='10.0.0.5').status_code, 429)
+
+  @override_settings(CMS_RATE_LIMIT_STORE='cache', CMS_RATE_LIMIT_RATE=0.01, CMS_RATE_LIMIT_BURST=1.0,
+                     CMS_CLIENT_ADDRESS_HEADER='HTTP_X_FORWARDED_FOR')
+  def test_address_header(self) -> None:
+    self.assertEqual(self.client.get(reverse('cms:index'), HTTP_X_FORWARDED_FOR='10.0.0.3').status_code, 200)
+    self.assertEqual(self.client.get(reverse('cms:index'), HTTP_X_FORWARDED_FOR='10.0.0.4').status_code, 200)
+    self.assertEqual(self.client.get(reverse('cms:index'), HTTP_X_FORWARDED_FOR='10.0.0.3').status_code, 429)
+
+
+class ConcurrencyLimitTestCase(BaseTestCase):
+  @override_settings(CMS_CONCURRENCY_LIMITS={'test': 1})
+  def test_limit(self) -> None:
+    rejected = metrics.snapshot().get('concurrency.rejected.test', 0)
+    entered, release = threading.Event(), threading.Event()
+
+    def hold() -> None:
+      with ConcurrencyLimiter.limit('test'):
+        entered.set()
+        release.wait()
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    entered.wait()
+    with self.assertRaises(Overloaded):
+      with ConcurrencyLimiter.limit('test'):
+        pass
+    release.set()
+    thread.join()
+    with ConcurrencyLimiter.limit('test'):
+      pass
+    self.assertEqual(metrics.snapshot()['concurrency.rejected.test'], rejected + 1)
+
+  @override_settings(CMS_CONCURRENCY_LIMITS={'category': 1}, CMS_CONCURRENCY_RETRY_AFTER=7)
+  def test_category_shed(self) -> None:
+    category = self._seed(self._name(), 1)[0]
+    with ConcurrencyLimiter.limit('category'):
+      resp = self.client.get(reverse('cms:category', args=[category.name]))
+      self.assertEqual(resp.status_code, 503)
+      self.assertEqual(resp['Retry-After'], '7')
+      resp = self.client.get(reverse('cms:api:article'), {'category': category.name})
+      self.assertEqual(resp.status_code, 503)
+    self.assertEqual(self.client.get(reverse('cms:category', args=[category.name])).status_code, 200)
+
+  def test_stale_page_served_when_shed(self) -> None:
+    page_cache = PageCache(self._name())
+    page_cache.get('page', lambda: 'old')
+    page_cache.expire('page')
+
+    def render() -> Optional[str]:
+      raise Overloaded('test', 1)
+
+    self.assertEqual(page_cache.get('page', render), 'old')
+    with self.assertRaises(Overloaded):
+      page_cache.get('missing', render)
+
+
+class MetricsViewTestCase(BaseTestCase):
+  def test_staff_only(self) -> None:
+    self._login()
+    self.assertEqual(self.client.get(reverse('cms:api:metrics')).status_code, 403)
+    self.user.is_staff = True
+    self.user.save()
+    metrics.increment('test')
+    resp = self.client.get(reverse('cms:api:metrics'))
+    self.assertEqual(resp.status_code, 200)
+    self.assertIn('test', self._deserialize(resp.content.decode('UTF-8')))
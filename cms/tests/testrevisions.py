@@ -0,0 +1,102 @@
+import json
+import random
+
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from .. import delta
+from ..models import Article, ArticleRevision
+from ..services import ArticleRevisionService, ArticleService
+from .base import BaseTestCase, ObjectType
+
+
+class DeltaTestCase(SimpleTestCase):
+  def test_round_trip(self) -> None:
+    rng = random.Random(0)
+    lines = [f'line {i}\n' for i in range(50)]
+    for i in range(20):
+      old = ''.join(rng.sample(lines, 30))
+      new = ''.join(rng.sample(lines, 30)) + 'no newline'
+      self.assertEqual(delta.apply(old, delta.diff(old, new)), new)
+
+  def test_compact(self) -> None:
+    old = ''.join(f'line {i}\n' for i in range(1000))
+    new = old.replace('line 500\n', 'changed\n')
+    self.assertLess(len(json.dumps(delta.diff(old, new))), 100)
+
+
+@override_settings(CMS_REVISION_SNAPSHOT_INTERVAL=4)
+class ArticleRevisionTestCase(BaseTestCase):
+  rest_path = reverse('cms:api:article')
+  revisions_path = reverse('cms:api:article_revisions')
+
+  def _create(self) -> ObjectType:
+    return self._create_object(self.rest_path, {
+      'name': self._name(),
+      'title': 'title 0',
+      'content': 'first line\nsecond line\n',
+      'category': 0,
+      'visible': True,
+      'direct_links_only': False,
+    })
+
+  def _revision(self, article_id: int, number: int, expected_code: int = 200) -> ObjectType:
+    resp = self.client.get(f'{self.revisions_path}?id={article_id}&revision={number}')
+    self.assertEqual(resp.status_code, expected_code)
+    return self._deserialize(resp.content.decode('UTF-8')) if expected_code == 200 else {}
+
+  def test_revisions(self) -> None:
+    self._login()
+    article = self._create()
+    versions = [dict(article)]
+    for i in range(1, 10):
+      article['title'] = f'title {i}'
+      article['content'] = f'{article["content"]}line {i}\n'
+      article = self._update_object(self.rest_path, article)
+      versions.append(dict(article))
+    listing = self._get_objects(f'{self.revisions_path}?id={article["id"]}')
+    self.assertEqual([r['number'] for r in listing], list(range(1, 11)))
+    self.assertEqual([r['snapshot'] for r in listing], [i % 4 == 0 for i in range(10)])
+    for number, version in enumerate(versions, 1):
+      revision = self._revision(article['id'], number)  # type: ignore
+      self.assertEqual(revision['title'], version['title'])
+      self.assertEqual(revision['content'], version['content'])
+    self._revision(article['id'], 11, 404)  # type: ignore
+
+  def test_bounded_reconstruction(self) -> None:
+    self._login()
+    article = self._create()
+    for i in range(10):
+      article['content'] = f'{article["content"]}line {i}\n'
+      article = self._update_object(self.rest_path, article)
+    with self.assertNumQueries(2):
+      self.client.get(f'{self.revisions_path}?id={article["id"]}&revision=8')
+    self.assertEqual(ArticleRevision.objects.filter(snapshot=True).count(), 3)
+
+  def test_interval_changed(self) -> None:
+    self._login()
+    with override_settings(CMS_REVISION_SNAPSHOT_INTERVAL=16):
+      article = self._create()
+      for i in range(5):
+        article['content'] = f'{article["content"]}line {i}\n'
+        article = self._update_object(self.rest_path, article)
+    self.assertEqual(self._revision(article['id'], 6)['content'], article['content'])  # type: ignore
+
+  def test_stale_copies(self) -> None:
+    self._login()
+    article = self._create()
+    first, second = Article.objects.get(id=article['id']), Article.objects.get(id=article['id'])
+    for copy, line in ((first, 'first edit\n'), (second, 'second edit\n')):
+      ArticleService.update(
+        copy, name=copy.name, author=None, title=copy.title, content=copy.content + line,
+        category=copy.category, visible=True, direct_links_only=False)
+    stored = Article.objects.get(id=article['id']).content
+    self.assertEqual(stored, 'first line\nsecond line\nsecond edit\n')
+    self.assertEqual(ArticleRevisionService.get(article['id'], 3)['content'], stored)  # type: ignore
+    self.assertEqual(
+      ArticleRevisionService.get(article['id'], 2)['content'],  # type: ignore
+      'first line\nsecond line\nfirst edit\n')
+
+  def test_not_logged_in(self) -> None:
+    resp = self.client.get(f'{self.revisions_path}?id=1')
+    self.assertEqual(resp.status_code, 403)
@@ -0,0 +1,170 @@
+import json
+import time
+from typing import Callable, Optional
+from unittest import mock
+
+from django.test import SimpleTestCase
+from django.core.cache import cache
+from django.urls import reverse
+
+from .. import schedule
+from ..cache import PageCache
+from ..models import NEVER, Article, timenow
+from ..services import ArticleService, CategoryService
+from .base import BaseTestCase, ObjectType
+
+
+class ScheduleTestCase(BaseTestCase):
+  def _create(self, name: str, publish_at: int = 0, expire_at: int = NEVER) -> Article:
+    return ArticleService.create(
+      name=name, author=self.user.id, title=name, content=name, category=0,
+      visible=True, direct_links_only=False, publish_at=publish_at, expire_at=expire_at)
+
+  def test_window(self) -> None:
+    now = timenow()
+    self._create('always')
+    self._create('published', publish_at=now - 1000)
+    self._create('scheduled', publish_at=now + 60000)
+    self._create('expired', expire_at=now - 1000)
+    self._create('expiring', expire_at=now + 60000)
+    self.assertEqual(
+      sorted(a.name for a in ArticleService.get_all()),
+      ['always', 'expiring', 'published'])
+    self.assertIsNone(ArticleService.get_by_name('scheduled'))
+
+  def test_next_change(self) -> None:
+    now = timenow()
+    self._create('always')
+    self.assertEqual(schedule.next_change(), NEVER)
+    self._create('expiring', expire_at=now + 60000)
+    self.assertEqual(schedule.next_change(), now + 60000)
+    article = self._create('scheduled', publish_at=now + 30000)
+    self.assertEqual(schedule.next_change(), now + 30000)
+    with self.assertNumQueries(0):
+      schedule.next_change()
+    ArticleService.update(
+      article, name=article.name, author=None, title=article.title, content=article.content,
+      category=0, visible=True, direct_links_only=False, publish_at=0)
+    self.assertEqual(schedule.next_change(), now + 60000)
+
+  def test_counts_ignore_window(self) -> None:
+    category = CategoryService.create(self._name(), self._name(), 0)
+    ArticleService.create(
+      name='scheduled', author=self.user.id, title='scheduled', content='scheduled', category=category.id,
+      visible=True, direct_links_only=False, publish_at=timenow() + 60000)
+    self.assertEqual(CategoryService.reconcile_counts(), 0)
+    category.refresh_from_db()
+    self.assertEqual(category.article_count, 1)
+
+  def test_api(self) -> None:
+    self._login()
+    data: ObjectType = {
+      'name': self._name(),
+      'title': 'title',
+      'content': 'content',
+      'category': 0,
+      'visible': True,
+      'direct_links_only': False,
+      'publish_at': timenow() + 60000,
+    }
+    article = self._create_object(reverse('cms:api:article'), data)
+    self.assertEqual(article['publish_at'], data['publish_at'])
+    self.assertEqual(article['expire_at'], NEVER)
+    self.assertEqual(len(self._get_objects(reverse('cms:api:article'))), 1)
+    self.client.logout()
+    self.assertEqual(self._get_objects(reverse('cms:api:article')), [])
+
+  def test_api_edit_scheduled(self) -> None:
+    self._login()
+    article = self._create('scheduled', publish_at=timenow() + 60000)
+    data = article.serialize()
+    data['content'] = 'fixed'
+    data['publish_at'] = 0
+    updated = self._update_object(reverse('cms:api:article'), data)
+    self.assertEqual(updated['content'], 'fixed')
+    self.assertEqual(updated['publish_at'], 0)
+    self.assertEqual(self._get_object(reverse('cms:api:article'), article.id)['content'], 'fixed')
+
+  def test_api_editors_see_window(self) -> None:
+    category = CategoryService.create(self._name(), self._name(), 0)
+    now = timenow()
+    scheduled = ArticleService.create(
+      name='scheduled', author=self.user.id, title='scheduled', content='scheduled', category=category.id,
+      visible=True, direct_links_only=False, publish_at=now + 60000)
+    self._create('expired', expire_at=now - 1000)
+    path = reverse('cms:api:article')
+    self._get_object(path, scheduled.id, 404)
+    self.assertEqual(self.client.get(path, {'name': 'expired'}).status_code, 404)
+    self.assertEqual(self._get_objects(path), [])
+    self._login()
+    self.assertEqual(self._get_object(path, scheduled.id)['name'], 'scheduled')
+    self.assertEqual(self.client.get(path, {'name': 'expired'}).status_code, 200)
+    self.assertEqual(sorted(a['name'] for a in self._get_objects(path)), ['expired', 'scheduled'])
+    resp = self.client.get(path, {'category': category.name})
+    self.assertEqual([a['name'] for a in json.loads(resp.content)], ['scheduled'])
+
+  def test_api_round_trip(self) -> None:
+    self._login()
+    article = self._create('always')
+    data = json.loads(json.dumps(article.serialize()))
+    # Parsed the way JavaScript clients parse JSON numbers
+    self.assertEqual(int(float(data['expire_at'])), NEVER)
+    data['expire_at'] = int(float(data['expire_at']))
+    self.assertEqual(self._update_object(reverse('cms:api:article'), data)['expire_at'], NEVER)
+    article.refresh_from_db()
+    self.assertFalse(article.is_scheduled())
+
+  def test_api_invalid_times(self) -> None:
+    self._login()
+    article = self._create('always').serialize()
+    for field, value in (('expire_at', 2 ** 63 - 1), ('publish_at', -1), ('publish_at', '0'), ('expire_at', 1.5)):
+      self._update_object(reverse('cms:api:article'), dict(article, **{field: value}), 400)
+      self._create_object(reverse('cms:api:article'), dict(article, name=self._name(), **{field: value}), 400)
+
+  def test_page_appears_on_time(self) -> None:
+    now = timenow()
+    # Within CMS_PAGE_CACHE_FRESH_SECONDS, so only the schedule expires the page
+    self._create('scheduled', publish_at=now + 10000)
+    path = reverse('cms:index')
+    self.assertNotContains(self.client.get(path), 'scheduled')
+    later = now + 10001
+    with mock.patch('cms.services.timenow', return_value=later), \
+         mock.patch('cms.schedule.timenow', return_value=later), \
+         mock.patch('cms.cache.time.time', return_value=later / 1000.0):
+      self.assertContains(self.client.get(path), 'scheduled')
+
+
+class ValidUntilTestCase(SimpleTestCase):
+  def setUp(self) -> None:
+    super().setUp()
+    cache.clear()
+    # Within CMS_PAGE_CACHE_FRESH_SECONDS
+    self.boundary = time.time() + 10
+    self.pages = PageCache(self.id())
+
+  def _get(self, render: Callable[[], Optional[str]]) -> Optional[str]:
+    return self.pages.get('a', render, lambda: self.boundary)
+
+  def test_fresh_until_boundary(self) -> None:
+    self.assertEqual(self._get(lambda: 'v1'), 'v1')
+    with mock.patch('cms.cache.time.time', return_value=self.boundary - 1):
+      self.assertEqual(self._get(lambda: 'v2'), 'v1')
+    with mock.patch('cms.cache.time.time', return_value=self.boundary):
+      self.assertEqual(self._get(lambda: 'v2'), 'v2')
+
+  def test_stale_not_served_past_boundary(self) -> None:
+    self._get(lambda: 'v1')
+    self.pages.expire('a')
+    cache.add(self.pages._key('a') + ':refresh', True)
+
+    def render() -> Optional[str]:
+      return 'v2'
+
+    self.assertEqual(self._get(render), 'v1')
+    with mock.patch('cms.cache.time.time', return_value=self.boundary + 1):
+      self.assertEqual(self._get(render), 'v2')
+
+  def test_past_boundary_not_cached(self) -> None:
+    self.boundary = time.time() - 1
+    self.assertEqual(self._get(lambda: 'v1'), 'v1')
+    self.assertEqual(self._get(lambda: 'v2'), 'v2')
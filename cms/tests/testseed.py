@@ -0,0 +1,66 @@
+import io
+from typing import List, Tuple
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+
+from ..models import DEFAULT_SITE, Article, ArticleRevision, Category, Task
+from ..seed import DatasetGenerator
+from ..services import ArticleService, CategoryService
+from .base import BaseTestCase
+
+
+class SeedTestCase(BaseTestCase):
+  def _generate(self, prefix: str) -> None:
+    DatasetGenerator(
+      author=self.user.id,
+      prefix=prefix,
+      seed=1,
+      fanout=3,
+      depth=3,
+      articles=500,
+      content_size=100,
+      batch_size=64,
+    ).generate()
+
+  def _snapshot(self, prefix: str) -> List[Tuple[str, str, bool]]:
+    return list(
+      Article.objects.filter(name__startswith=prefix)
+      .order_by('id')
+      .values_list('title', 'content', 'visible'))
+
+  def test_generate(self) -> None:
+    self._generate('first')
+    self.assertEqual(Category.objects.count(), 1 + 3 + 9)
+    self.assertEqual(Article.objects.count(), 500)
+    root = CategoryService.get_by_name('first-0')
+    self.assertEqual(root.total_article_count, len(ArticleService.get_by_category(root)))  # type: ignore
+    self.assertEqual(CategoryService.reconcile_counts(), 0)
+
+  def test_deterministic(self) -> None:
+    self._generate('first')
+    self._generate('second')
+    self.assertEqual(self._snapshot('first'), self._snapshot('second'))
+
+  @override_settings(CMS_TASK_QUEUE='database')
+  def test_clear_site(self) -> None:
+    DatasetGenerator(author=self.user.id, site=DEFAULT_SITE + 1, depth=1, articles=5).generate()
+    for site in (DEFAULT_SITE, DEFAULT_SITE + 1):
+      ArticleService.create(
+        name='written', author=self.user.id, title='written', content='written', category=0,
+        visible=True, direct_links_only=False, site=site)
+    path = reverse('cms:article', args=['written'])
+    self.assertEqual(self.client.get(path).status_code, 200)
+    progress = mock.Mock()
+    # Four deletes in a savepoint, nothing is loaded whatever the size of the site
+    with self.assertNumQueries(6):
+      DatasetGenerator(author=self.user.id, progress=progress).clear()
+    progress.assert_called_once_with('Deleted 1 articles and 0 categories')
+    self.assertEqual(self.client.get(path).status_code, 404)
+    self.assertEqual(list(Task.objects.values_list('site', flat=True)), [DEFAULT_SITE + 1])
+    self.assertEqual(ArticleRevision.objects.count(), 1)
+    call_command('seed', depth=1, articles=5, clear=True, author=self.user.username, stdout=io.StringIO())
+    self.assertEqual(Article.objects.filter(site=DEFAULT_SITE).count(), 5)
+    self.assertEqual(Article.objects.filter(site=DEFAULT_SITE + 1).count(), 6)
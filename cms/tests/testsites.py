@@ -0,0 +1,144 @@
+import json
+
+from django.test import override_settings
+from django.urls import reverse
+
+from ..models import DEFAULT_SITE, Site
+from ..services import ArticleService, CategoryService, SiteService
+from ..tasks import TaskQueue
+from .base import BaseTestCase, ObjectType
+
+HOST = 'brand.example'
+
+
+@override_settings(ALLOWED_HOSTS=['testserver', HOST])
+class SiteTestCase(BaseTestCase):
+  def setUp(self) -> None:
+    super().setUp()
+    self.site = Site.objects.create(
+      name='brand',
+      domain=HOST,
+      title='Brand title',
+      slogan='Brand slogan',
+      base_url=f'https://{HOST}',
+      sidebar=json.dumps([['Brand home', '/']]),
+    )
+
+  def _create_article(self, site: int, content: str) -> None:
+    category = CategoryService.create('news', f'News of {site}', 0, site=site)
+    ArticleService.create(
+      name='hello', author=self.user.id, title='Hello', content=content,
+      category=category.id, visible=True, direct_links_only=False, site=site)
+
+  def test_resolve_by_host(self) -> None:
+    self.assertEqual(SiteService.get_by_host(HOST).id, self.site.id)
+    self.assertEqual(SiteService.get_by_host('BRAND.example').id, self.site.id)
+    self.assertEqual(SiteService.get_by_host('unknown.example').id, DEFAULT_SITE)
+
+  def test_site_changes_expire_hosts(self) -> None:
+    SiteService.get_by_host(HOST)
+    self.site.domain = 'other.example'
+    self.site.save()
+    self.assertEqual(SiteService.get_by_host(HOST).id, DEFAULT_SITE)
+    self.assertEqual(SiteService.get_by_host('other.example').id, self.site.id)
+
+  def test_same_names_in_sites(self) -> None:
+    self._create_article(DEFAULT_SITE, 'default content')
+    self._create_article(self.site.id, 'brand content')
+    resp = self.client.get(reverse('cms:article', args=['hello']))
+    self.assertContains(resp, 'default content')
+    self.assertContains(resp, 'GazpachoCMS')
+    resp = self.client.get(reverse('cms:article', args=['hello']), HTTP_HOST=HOST)
+    self.assertContains(resp, 'brand content')
+    self.assertContains(resp, 'Brand title')
+    self.assertContains(resp, 'Brand home')
+    self.assertNotContains(resp, 'default content')
+    resp = self.client.get(reverse('cms:category', args=['news']), HTTP_HOST=HOST)
+    self.assertContains(resp, 'brand content')
+    self.assertNotContains(resp, 'default content')
+
+  def test_api_isolation(self) -> None:
+    self._create_article(self.site.id, 'brand content')
+    article = ArticleService.get_by_name('hello', self.site.id)
+    self.assertEqual(self._get_objects(reverse('cms:api:article')), [])
+    self._get_object(reverse('cms:api:article'), article.id, 404)  # type: ignore
+    resp = self.client.get(reverse('cms:api:article'), HTTP_HOST=HOST)
+    self.assertEqual(len(json.loads(resp.content)), 1)
+    self._login()
+    resp = self.client.post(reverse('cms:api:category'), {
+      'name': 'news',
+      'long_name': 'News',
+      'parent': 0,
+    }, content_type='application/json')
+    self.assertEqual(resp.status_code, 200)
+    self.assertEqual(json.loads(resp.content)['site'], DEFAULT_SITE)
+
+  def test_revisions_isolation(self) -> None:
+    self._create_article(self.site.id, 'brand content')
+    article = ArticleService.get_by_name('hello', self.site.id)
+    self._login()
+    path = reverse('cms:api:article_revisions')
+    self.assertEqual(self.client.get(f'{path}?id={article.id}').status_code, 404)  # type: ignore
+    self.assertEqual(self.client.get(f'{path}?id={article.id}&revision=1').status_code, 404)  # type: ignore
+    resp = self.client.get(f'{path}?id={article.id}&revision=1', HTTP_HOST=HOST)  # type: ignore
+    self.assertEqual(json.loads(resp.content)['content'], 'brand content')
+    resp = self.client.get(f'{path}?id={article.id}', HTTP_HOST=HOST)  # type: ignore
+    self.assertEqual(len(json.loads(resp.content)), 1)
+
+  def test_categories_of_other_sites_rejected(self) -> None:
+    other = CategoryService.create('news', 'News', 0, site=self.site.id)
+    own = CategoryService.create('news', 'News', 0)
+    self._login()
+    self._create_object(reverse('cms:api:category'), {
+      'name': 'child',
+      'long_name': 'Child',
+      'parent': other.id,
+    }, 400)
+    article: ObjectType = {
+      'name': 'hello',
+      'title': 'Hello',
+      'content': 'content',
+      'category': other.id,
+      'visible': True,
+      'direct_links_only': False,
+    }
+    self._create_object(reverse('cms:api:article'), article, 400)
+    article = self._create_object(reverse('cms:api:article'), dict(article, category=own.id))
+    self._update_object(reverse('cms:api:article'), dict(article, category=other.id), 400)
+    self._update_object(reverse('cms:api:category'), dict(own.serialize(), parent=other.id), 400)
+    other.refresh_from_db()
+    self.assertEqual(other.article_count, 0)
+
+  def test_category_tree_per_site(self) -> None:
+    root = CategoryService.create('news', 'News', 0)
+    child = CategoryService.create('local', 'Local', root.id)
+    other = CategoryService.create('news', 'News', 0, site=self.site.id)
+    self.assertEqual(CategoryService._get_descendant_ids(root.id, DEFAULT_SITE), {root.id, child.id})
+    with self.assertNumQueries(0):
+      parents, children = CategoryService._get_tree(DEFAULT_SITE)
+    self.assertEqual(children[root.id], [child.id])
+    self.assertNotIn(other.id, parents)
+    CategoryService.create('sport', 'Sport', other.id, site=self.site.id)
+    with self.assertNumQueries(0):
+      CategoryService._get_tree(DEFAULT_SITE)
+
+  def test_feeds(self) -> None:
+    self._create_article(self.site.id, 'brand content')
+    resp = self.client.get(reverse('cms:feed'), HTTP_HOST=HOST)
+    self.assertContains(resp, 'Brand title')
+    self.assertContains(resp, f'https://{HOST}/a/hello')
+    resp = self.client.get(reverse('cms:sitemap_categories'))
+    self.assertNotContains(resp, '/c/news')
+
+  def test_writes_expire_own_site(self) -> None:
+    self._create_article(DEFAULT_SITE, 'default content')
+    self._create_article(self.site.id, 'first content')
+    path = reverse('cms:article', args=['hello'])
+    self.assertContains(self.client.get(path, HTTP_HOST=HOST), 'first content')
+    article = ArticleService.get_by_name('hello', self.site.id)
+    ArticleService.update(
+      article, name='hello', author=None, title='Hello', content='second content',  # type: ignore
+      category=article.category, visible=True, direct_links_only=False)  # type: ignore
+    TaskQueue.run_pending()
+    self.assertContains(self.client.get(path, HTTP_HOST=HOST), 'second content')
+    self.assertContains(self.client.get(path), 'default content')
@@ -0,0 +1,19 @@
+from django.core.cache import cache
+from django.urls import reverse
+
+from ..models import DEFAULT_SITE
+from ..services import CATEGORY_TREE_CACHE_KEY
+from ..warmup import warm_up
+from .base import BaseTestCase
+
+
+class StartupTestCase(BaseTestCase):
+  def test_warm_up(self) -> None:
+    self._seed(self._name(), 2)
+    warm_up()
+    parents, children = cache.get(CATEGORY_TREE_CACHE_KEY.format(DEFAULT_SITE))
+    self.assertEqual(len(parents), 3)
+
+  def test_lazy_views(self) -> None:
+    self._login()
+    self.assertEqual(self.client.get(reverse('admin:index')).status_code, 302)
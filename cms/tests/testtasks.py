@@ -0,0 +1,96 @@
+from typing import List
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .. import checks
+from ..models import Task
+from ..services import ArticleService
+from ..tasks import TaskQueue
+from .base import BaseTestCase
+
+
+class TaskQueueTestCase(TestCase):
+  def setUp(self) -> None:
+    super().setUp()
+    self.calls: List[int] = []
+    TaskQueue.register('test.record', self._record)
+    TaskQueue.register('test.fail', self._fail)
+
+  def _record(self, value: int) -> None:
+    self.calls.append(value)
+
+  def _fail(self) -> None:
+    raise ValueError('failed')
+
+  def test_run_pending(self) -> None:
+    TaskQueue.enqueue('test.record', value=1)
+    TaskQueue.enqueue('test.record', value=2)
+    self.assertEqual(self.calls, [])
+    self.assertEqual(TaskQueue.depth()['pending'], 2)
+    self.assertEqual(TaskQueue.run_pending(), 2)
+    self.assertEqual(self.calls, [1, 2])
+    self.assertEqual(TaskQueue.depth()['pending'], 0)
+
+  def test_unknown_task(self) -> None:
+    with self.assertRaises(KeyError):
+      TaskQueue.enqueue('test.unknown')
+
+  @override_settings(CMS_TASK_MAX_ATTEMPTS=2)
+  def test_retry_then_fail(self) -> None:
+    TaskQueue.enqueue('test.fail')
+    self.assertEqual(TaskQueue.run_pending(), 1)
+    task = Task.objects.get()
+    self.assertEqual(task.attempts, 1)
+    self.assertEqual(task.status, Task.PENDING)
+    # Not due until the backoff passes
+    self.assertEqual(TaskQueue.run_pending(), 0)
+    Task.objects.update(run_after=0)
+    self.assertEqual(TaskQueue.run_pending(), 1)
+    task = Task.objects.get()
+    self.assertEqual(task.status, Task.FAILED)
+    self.assertIn('failed', task.last_error)
+    self.assertEqual(TaskQueue.depth()['failed'], 1)
+
+  @override_settings(CMS_TASK_QUEUE='local')
+  def test_local_runs_on_commit(self) -> None:
+    with self.captureOnCommitCallbacks(execute=True):
+      TaskQueue.enqueue('test.record', value=1)
+      self.assertEqual(self.calls, [])
+    self.assertEqual(self.calls, [1])
+    self.assertFalse(Task.objects.exists())
+
+
+LOCMEM = 'django.core.cache.backends.locmem.LocMemCache'
+MEMCACHED = 'django.core.cache.backends.memcached.PyMemcacheCache'
+
+
+# Local memory caches sharing a location share their entries, as the web
+# workers and runworker share memcached
+@override_settings(CACHES={
+  'default': {'BACKEND': LOCMEM, 'LOCATION': 'shared'},
+  'worker': {'BACKEND': LOCMEM, 'LOCATION': 'shared'},
+})
+class WorkerCacheTestCase(BaseTestCase):
+  def test_worker_expires_pages(self) -> None:
+    article = ArticleService.create(
+      name='cached', author=self.user.id, title='title', content='first content', category=0,
+      visible=True, direct_links_only=False)
+    path = reverse('cms:article', args=['cached'])
+    self.assertContains(self.client.get(path), 'first content')
+    ArticleService.update(
+      article, name='cached', author=None, title='title', content='second content', category=0,
+      visible=True, direct_links_only=False)
+    with mock.patch('cms.cache.cache', caches['worker']), mock.patch('cms.services.cache', caches['worker']):
+      TaskQueue.run_pending()
+    self.assertContains(self.client.get(path), 'second content')
+
+  def test_database_queue_needs_shared_cache(self) -> None:
+    with override_settings(CACHES={'default': {'BACKEND': LOCMEM}}):
+      self.assertEqual([e.id for e in checks.check_shared_cache(None)], ['cms.E001'])
+      with override_settings(CMS_TASK_QUEUE='local'):
+        self.assertEqual([e.id for e in checks.check_shared_cache(None)], ['cms.W001'])
+    with override_settings(CACHES={'default': {'BACKEND': MEMCACHED, 'LOCATION': '127.0.0.1:11211'}}):
+      self.assertEqual(checks.check_shared_cache(None), [])
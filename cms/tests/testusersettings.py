@@ -0,0 +1,53 @@
+from django.contrib.auth.models import User
+from django.urls import reverse
+
+from ..services import UserSettingsService
+from .base import BaseTestCase
+
+
+class UserSettingsTestCase(BaseTestCase):
+  def setUp(self) -> None:
+    super().setUp()
+    self.other = User.objects.create_user(username='other', password='pwd')
+    self.third = User.objects.create_user(username='third', password='pwd')
+    UserSettingsService.create(self.user.id, 'Test User')
+    UserSettingsService.create(self.other.id, 'Other User')
+
+  def test_read_through(self) -> None:
+    with self.assertNumQueries(1):
+      self.assertEqual(UserSettingsService.get_by_userid(self.user.id).name, 'Test User')  # type: ignore
+    with self.assertNumQueries(0):
+      self.assertEqual(UserSettingsService.get_by_userid(self.user.id).name, 'Test User')  # type: ignore
+
+  def test_missing_settings_cached(self) -> None:
+    with self.assertNumQueries(1):
+      self.assertIsNone(UserSettingsService.get_by_userid(self.third.id))
+    with self.assertNumQueries(0):
+      self.assertIsNone(UserSettingsService.get_by_userid(self.third.id))
+
+  def test_batched(self) -> None:
+    UserSettingsService.get_by_userid(self.user.id)
+    with self.assertNumQueries(1):
+      loaded = UserSettingsService.get_by_userids([self.user.id, self.other.id, self.third.id])
+    self.assertEqual(set(loaded), {self.user.id, self.other.id})
+
+  def test_update_expires(self) -> None:
+    settings = UserSettingsService.get_by_userid(self.user.id)
+    UserSettingsService.update(settings, 'Renamed')  # type: ignore
+    self.assertEqual(UserSettingsService.get_by_userid(self.user.id).name, 'Renamed')  # type: ignore
+    self.assertEqual(UserSettingsService.get_author_names([self.user.id]), {self.user.id: 'Renamed'})
+
+  def test_author_names(self) -> None:
+    userids = [self.user.id, self.other.id, self.third.id]
+    expected = {self.user.id: 'Test User', self.other.id: 'Other User', self.third.id: 'third'}
+    with self.assertNumQueries(2):
+      self.assertEqual(UserSettingsService.get_author_names(userids), expected)
+    with self.assertNumQueries(0):
+      self.assertEqual(UserSettingsService.get_author_names(userids), expected)
+    self.third.username = 'renamed'
+    self.third.save()
+    self.assertEqual(UserSettingsService.get_author_names([self.third.id]), {self.third.id: 'renamed'})
+
+  def test_author_in_listing(self) -> None:
+    self._seed(self._name(), 1)
+    self.assertContains(self.client.get(reverse('cms:index')), 'Test User')
@@ -1,12 +1,38 @@
+from typing import Any, Callable, Optional
+
+from django.http import HttpRequest, HttpResponse
 from django.urls import path, include
+from django.utils.module_loading import import_string
+
 from . import views
 
+ViewFunction = Callable[..., HttpResponse]
+
+
+def lazy_view(dotted_path: str, class_based: bool = False) -> ViewFunction:
+  '''Imports a rarely used view on its first request instead of at startup.'''
+  view: Optional[ViewFunction] = None
+
+  def wrapper(request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponse:
+    nonlocal view
+    if view is None:
+      imported = import_string(dotted_path)
+      view = imported.as_view() if class_based else imported
+    return view(request, *args, **kwargs)  # type: ignore
+
+  return wrapper
+
+
 app_name = 'cms'
 urlpatterns = [
   path('api/', include('cms.api_urls', namespace='api')),
-  path('login', views.LoginView.as_view(), name='login'),
+  path('login', lazy_view('cms.authviews.LoginView', class_based=True), name='login'),
   path('', views.CmsView.index, name='index'),
-  path('debug', views.debug, name='debug'),
   path('a/<slug:name>', views.CmsView.article, name='article'),
   path('c/<slug:name>', views.CmsView.category, name='category'),
+  path('c/<slug:name>/feed', views.FeedView.category_feed, name='category_feed'),
+  path('feed', views.FeedView.feed, name='feed'),
+  path('sitemap.xml', views.FeedView.sitemap_index, name='sitemap'),
+  path('sitemap-categories.xml', views.FeedView.sitemap_categories, name='sitemap_categories'),
+  path('sitemap-<int:chunk>.xml', views.FeedView.sitemap_chunk, name='sitemap_chunk'),
 ]
@@ -1,16 +1,19 @@
 import json
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List, Optional
 
-from django.contrib.auth.models import User
-from django.contrib.auth.views import LoginView as BaseLoginView
 from django.http import HttpRequest, HttpResponse, HttpResponseForbidden, HttpResponseNotFound, HttpResponseBadRequest
-from django.middleware import csrf
 from django.template.loader import render_to_string
 from django.urls import reverse
 from django.views import View
 
-from .models import Article, Category
-from .services import ArticleService, ServiceError, AlreadyExistsError, CategoryService
+from . import metrics, schedule
+from .profiling import profiles
+from .cache import feed_cache, page_cache, site_prefix
+from .feeds import AtomFeed, Sitemap
+from .middleware import get_site
+from .models import NEVER, Article, Category, Site
+from .ratelimit import ConcurrencyLimiter, Overloaded
+from .services import ArticleRevisionService, ArticleService, ServiceError, AlreadyExistsError, CategoryService, CycleError, InvalidScheduleError, SiteMismatchError, UserSettingsService
 
 
 class CmsViewMixin:
@@ -19,16 +22,12 @@ class CmsViewMixin:
     return {'name': name, 'url': url}
 
   @classmethod
-  def get_template_context(cls, extra: Dict[Any, Any] = {}) -> Dict[Any, Any]:
+  def get_template_context(cls, site: Site, extra: Dict[Any, Any] = {}) -> Dict[Any, Any]:
     ctx = {
-      'sidebar': [
-        cls._gen_sidebar('Home', '/'),
-        cls._gen_sidebar('About Me', '/a/about'),
-        cls._gen_sidebar('Articles about cats', '/c/cats'),
-      ],
+      'sidebar': [cls._gen_sidebar(name, url) for name, url in site.sidebar_links()],
       'settings': {
-        'title': 'GazpachoCMS',
-        'slogan': 'JS-Free Content Management System',
+        'title': site.title,
+        'slogan': site.slogan,
       }
     }
     ctx.update(extra)
@@ -36,28 +35,16 @@ class CmsViewMixin:
 
   @classmethod
   def handle_service_error(cls, e: ServiceError) -> HttpResponse:
-    if isinstance(e, AlreadyExistsError):
+    if isinstance(e, (AlreadyExistsError, CycleError, InvalidScheduleError, SiteMismatchError)):
       return HttpResponseBadRequest()
     # TODO: log and raise an unknown error
     raise e
 
-
-class UserView(CmsViewMixin, View):
-  def get(self, request: HttpRequest) -> HttpResponse:
-    return HttpResponse(csrf.get_token(request))
-
-  def head(self, request: HttpRequest) -> HttpResponse:
-    return HttpResponse('head ' + str(request.__class__))
-
-  def post(self, request: HttpRequest) -> HttpResponse:
-    return HttpResponse('post ' + str(request.__class__))
-
-  def put(self, request: HttpRequest) -> HttpResponse:
-    return HttpResponse('put ' + str(request.__class__))
-
-
-class LoginView(CmsViewMixin, BaseLoginView):
-  template_name = 'login.html'
+  @classmethod
+  def handle_overloaded(cls, e: Overloaded) -> HttpResponse:
+    response = HttpResponse(status=503)
+    response['Retry-After'] = str(e.retry_after)
+    return response
 
 
 class CmsView(CmsViewMixin):
@@ -70,72 +57,163 @@ class CmsView(CmsViewMixin):
     }
 
   @classmethod
-  def _serialize_article(cls, article: Article) -> Dict[str, str]:
+  def _serialize_article(cls, article: Article, author_names: Dict[int, str]) -> Dict[str, str]:
     return {
       'title': article.title,
       'url': reverse('cms:article', args=[article.name]),
       'content': article.content,
+      'author': author_names.get(article.author, ''),
     }
 
   @classmethod
-  def index(cls, request: HttpRequest) -> HttpResponse:
-    articles = ArticleService.get_all()
-    return HttpResponse(render_to_string(
+  def _serialize_articles(cls, articles: List[Article]) -> List[Dict[str, str]]:
+    author_names = UserSettingsService.get_author_names(a.author for a in articles)
+    return [cls._serialize_article(article, author_names) for article in articles]
+
+  @classmethod
+  def _gen_breadcrumbs(cls, categories: List[Category]) -> List[Dict[Any, Any]]:
+    return [
+      cls._gen_sidebar(category.long_name, reverse('cms:category', args=[category.name]))
+      for category in categories
+    ]
+
+  @classmethod
+  def _render_index(cls, site: Site) -> Optional[str]:
+    articles = ArticleService.get_all(site.id)
+    return render_to_string(
       'articles.html',
-      cls.get_template_context({'articles': [
-        cls._serialize_article(article)
-        for article in articles
-      ]}),
-    ))
+      cls.get_template_context(site, {'articles': cls._serialize_articles(articles)}),
+    )
 
   @classmethod
-  def article(cls, request: HttpRequest, name: str) -> HttpResponse:
-    article = ArticleService.get_by_name(name)
+  def _render_article(cls, site: Site, name: str) -> Optional[str]:
+    article = ArticleService.get_by_name(name, site.id)
     if article is None:
-      return HttpResponseNotFound()
-    return HttpResponse(render_to_string(
+      return None
+    category = CategoryService.get_by_id(article.category, site.id) if article.category else None
+    return render_to_string(
       'article.html',
-      cls.get_template_context({
-        'article': cls._serialize_article(article)
+      cls.get_template_context(site, {
+        'article': cls._serialize_articles([article])[0],
+        'breadcrumbs': cls._gen_breadcrumbs(
+          CategoryService.get_ancestors(category) + [category] if category else []),
       }),
-    ))
+    )
 
   @classmethod
-  def category(cls, request: HttpRequest, name: str) -> HttpResponse:
-    category = CategoryService.get_by_name(name)
+  def _render_category(cls, site: Site, name: str) -> Optional[str]:
+    category = CategoryService.get_by_name(name, site.id)
     if category is None:
-      return HttpResponseNotFound()
-    articles = ArticleService.get_by_category(category)
-    return HttpResponse(render_to_string(
+      return None
+    with ConcurrencyLimiter.limit('category'):
+      articles = ArticleService.get_by_category(category)
+    return render_to_string(
       'articles.html',
-      cls.get_template_context({'articles': [
-        cls._serialize_article(article)
-        for article in articles
-      ]}),
-    ))
+      cls.get_template_context(site, {
+        'articles': cls._serialize_articles(articles),
+        'breadcrumbs': cls._gen_breadcrumbs(CategoryService.get_ancestors(category) + [category]),
+      }),
+    )
+
+  @classmethod
+  def _cached_response(cls, site: Site, key: str, render: Callable[[], Optional[str]]) -> HttpResponse:
+    try:
+      body = page_cache.get(f'{site_prefix(site.id)}:{key}', render, lambda: schedule.valid_until(site.id))
+    except Overloaded as e:
+      return cls.handle_overloaded(e)
+    if body is None:
+      return HttpResponseNotFound()
+    return HttpResponse(body)
+
+  @classmethod
+  def index(cls, request: HttpRequest) -> HttpResponse:
+    site = get_site(request)
+    return cls._cached_response(site, 'index', lambda: cls._render_index(site))
+
+  @classmethod
+  def article(cls, request: HttpRequest, name: str) -> HttpResponse:
+    site = get_site(request)
+    return cls._cached_response(site, f'article:{name}', lambda: cls._render_article(site, name))
+
+  @classmethod
+  def category(cls, request: HttpRequest, name: str) -> HttpResponse:
+    site = get_site(request)
+    return cls._cached_response(site, f'category:{name}', lambda: cls._render_category(site, name))
+
+
+class FeedView(CmsViewMixin):
+  @classmethod
+  def _cached_response(
+      cls, site: Site, key: str, render: Callable[[], Optional[str]], content_type: str) -> HttpResponse:
+    try:
+      body = feed_cache.get(f'{site_prefix(site.id)}:{key}', render, lambda: schedule.valid_until(site.id))
+    except Overloaded as e:
+      return cls.handle_overloaded(e)
+    if body is None:
+      return HttpResponseNotFound()
+    return HttpResponse(body, content_type=content_type)
+
+  @classmethod
+  def sitemap_index(cls, request: HttpRequest) -> HttpResponse:
+    site = get_site(request)
+    return cls._cached_response(site, 'sitemap:index', lambda: Sitemap.render_index(site), 'application/xml')
+
+  @classmethod
+  def sitemap_chunk(cls, request: HttpRequest, chunk: int) -> HttpResponse:
+    site = get_site(request)
+    return cls._cached_response(
+      site, f'sitemap:{chunk}', lambda: Sitemap.render_chunk(site, chunk), 'application/xml')
+
+  @classmethod
+  def sitemap_categories(cls, request: HttpRequest) -> HttpResponse:
+    site = get_site(request)
+    return cls._cached_response(
+      site, 'sitemap:categories', lambda: Sitemap.render_categories(site), 'application/xml')
+
+  @classmethod
+  def feed(cls, request: HttpRequest) -> HttpResponse:
+    site = get_site(request)
+    return cls._cached_response(site, 'feed:', lambda: AtomFeed.render(site), 'application/atom+xml')
+
+  @classmethod
+  def category_feed(cls, request: HttpRequest, name: str) -> HttpResponse:
+    site = get_site(request)
+
+    def render() -> Optional[str]:
+      with ConcurrencyLimiter.limit('category'):
+        return AtomFeed.render(site, name)
+    return cls._cached_response(site, f'feed:{name}', render, 'application/atom+xml')
 
 
 class ArticleView(CmsViewMixin, View):
   service = ArticleService
 
   def get(self, request: HttpRequest) -> HttpResponse:
+    site = get_site(request)
+    # Editors reach articles outside their publishing window
+    only_published = not request.user.is_authenticated
     if 'id' in request.GET or 'name' in request.GET:
       if 'id' in request.GET:
-        article = self.service.get_by_id(int(request.GET['id']))
+        article = self.service.get_by_id(int(request.GET['id']), site.id, only_published)
       elif 'name' in request.GET:
-        article = self.service.get_by_name(request.GET['name'])
+        article = self.service.get_by_name(request.GET['name'], site.id, only_published)
       if article is None:
         return HttpResponseNotFound()
       return HttpResponse(json.dumps(article.serialize()))
     articles: List[Article] = []
     if 'category' in request.GET:
-      category = CategoryService.get_by_name(request.GET['category'])
+      category = CategoryService.get_by_name(request.GET['category'], site.id)
       if category is None:
         return HttpResponseNotFound()
-      articles = self.service.get_by_category(category,
-                                              'descendants' in request.GET)
+      try:
+        with ConcurrencyLimiter.limit('category'):
+          articles = self.service.get_by_category(category,
+                                                  'descendants' in request.GET,
+                                                  only_published)
+      except Overloaded as e:
+        return self.handle_overloaded(e)
     else:
-      articles = self.service.get_all()
+      articles = self.service.get_all(site.id, only_published)
     return HttpResponse(json.dumps([a.serialize() for a in articles]))
 
   def post(self, request: HttpRequest) -> HttpResponse:
@@ -151,6 +229,9 @@ class ArticleView(CmsViewMixin, View):
         category=body['category'],
         visible=body['visible'],
         direct_links_only=body['direct_links_only'],
+        publish_at=body.get('publish_at', 0),
+        expire_at=body.get('expire_at', NEVER),
+        site=get_site(request).id,
       )
     except ServiceError as e:
       return self.handle_service_error(e)
@@ -160,7 +241,7 @@ class ArticleView(CmsViewMixin, View):
     if not request.user.is_authenticated:
       return HttpResponseForbidden()
     body = json.loads(request.body)
-    article = self.service.get_by_id(int(body['id']))
+    article = self.service.get_for_edit(int(body['id']), get_site(request).id)
     if article is None:
       return HttpResponseNotFound()
     try:
@@ -173,6 +254,8 @@ class ArticleView(CmsViewMixin, View):
         category=body['category'],
         visible=body['visible'],
         direct_links_only=body['direct_links_only'],
+        publish_at=body.get('publish_at'),
+        expire_at=body.get('expire_at'),
       )
 
     except ServiceError as e:
@@ -185,20 +268,45 @@ class ArticleView(CmsViewMixin, View):
     return HttpResponse(json.dumps(request.GET))
 
 
+class ArticleRevisionView(CmsViewMixin, View):
+  service = ArticleRevisionService
+
+  def get(self, request: HttpRequest) -> HttpResponse:
+    if not request.user.is_authenticated:
+      return HttpResponseForbidden()
+    if 'id' not in request.GET:
+      return HttpResponseBadRequest()
+    article_id = int(request.GET['id'])
+    site = get_site(request)
+    if 'revision' in request.GET:
+      revision = self.service.get(article_id, int(request.GET['revision']), site.id)
+      if revision is None:
+        return HttpResponseNotFound()
+      return HttpResponse(json.dumps(revision))
+    revisions = self.service.get_all(article_id, site.id)
+    if not revisions:
+      return HttpResponseNotFound()
+    return HttpResponse(json.dumps(revisions))
+
+
 class CategoryView(CmsViewMixin, View):
   service = CategoryService
 
   def get(self, request: HttpRequest) -> HttpResponse:
+    site = get_site(request)
     if 'id' in request.GET or 'name' in request.GET:
       if 'id' in request.GET:
-        category = self.service.get_by_id(int(request.GET['id']))
+        category = self.service.get_by_id(int(request.GET['id']), site.id)
       elif 'name' in request.GET:
-        category = self.service.get_by_name(request.GET['name'])
+        category = self.service.get_by_name(request.GET['name'], site.id)
       if category is None:
         return HttpResponseNotFound()
-      return HttpResponse(json.dumps(category.serialize()))
+      data: Dict[str, Any] = category.serialize()
+      if 'ancestors' in request.GET:
+        data['ancestors'] = [a.serialize() for a in self.service.get_ancestors(category)]
+      return HttpResponse(json.dumps(data))
     else:
-      categories = self.service.get_all()
+      categories = self.service.get_all(site.id)
     return HttpResponse(json.dumps([a.serialize() for a in categories]))
 
   def post(self, request: HttpRequest) -> HttpResponse:
@@ -210,6 +318,7 @@ class CategoryView(CmsViewMixin, View):
         name=body['name'],
         long_name=body['long_name'],
         parent=body['parent'],
+        site=get_site(request).id,
       )
     except ServiceError as e:
       return self.handle_service_error(e)
@@ -219,7 +328,7 @@ class CategoryView(CmsViewMixin, View):
     if not request.user.is_authenticated:
       return HttpResponseForbidden()
     body = json.loads(request.body)
-    category = self.service.get_by_id(body['id'])
+    category = self.service.get_by_id(body['id'], get_site(request).id)
     if category is None:
       return HttpResponseNotFound()
     try:
@@ -239,47 +348,33 @@ class CategoryView(CmsViewMixin, View):
     return HttpResponse(json.dumps(request.GET))
 
 
-def debug(request: HttpRequest) -> HttpResponse:
-  # TODO: use service stuff or not?
-  Article.objects.all().delete()
-  Category.objects.all().delete()
-  try:
-    u = User.objects.get(username='test')
-    u.delete()
-  except User.DoesNotExist:
-    pass
-  u = User.objects.create_user(username='test', password='qwerasdf')
-  food_category = CategoryService.create('food', 'Food', 0)
-  animals_category = CategoryService.create('animals', 'Animals', 0)
-  cats_category = CategoryService.create('cats', 'Cats', animals_category.id)
-  big_cats_category = CategoryService.create('big_cats', 'Big Cats', cats_category.id)
-  for cat in [food_category, animals_category, cats_category, big_cats_category]:
-    for i in range(3):
-      ArticleService.create(
-        name=f'{cat.name}_{i}',
-        author=u.id,
-        title=f'article {i} title about {cat.long_name}',
-        content='\n'.join([f'{i}: {cat.name}{j}' for j in range(10)]),
-        category=cat.id,
-        direct_links_only=False,
-        visible=True,
-      )
-  ArticleService.create(
-    name=f'about',
-    author=u.id,
-    title=f'About page',
-    content='This is about me',
-    category=0,
-    direct_links_only=True,
-    visible=True,
-  )
-  ArticleService.create(
-    name=f'invisible',
-    author=u.id,
-    title=f'Invisible page',
-    content='This page should not be visible',
-    category=0,
-    direct_links_only=False,
-    visible=False,
-  )
-  return HttpResponse('ok')
+class MetricsView(View):
+  def get(self, request: HttpRequest) -> HttpResponse:
+    if not request.user.is_staff:
+      return HttpResponseForbidden()
+    return HttpResponse(json.dumps(metrics.snapshot()))
+
+
+class ProfileView(View):
+  def get(self, request: HttpRequest) -> HttpResponse:
+    if not request.user.is_staff:
+      return HttpResponseForbidden()
+    if 'id' not in request.GET:
+      return HttpResponse(json.dumps([p.summary() for p in profiles.get_all()]))
+    profile = profiles.get(int(request.GET['id']))
+    if profile is None:
+      return HttpResponseNotFound()
+    if 'download' in request.GET:
+      # cProfile stats load with pstats and its viewers, stacks with flame graph tools
+      if profile.stats is not None:
+        response = HttpResponse(profile.stats, content_type='application/octet-stream')
+        response['Content-Disposition'] = f'attachment; filename="profile-{profile.id}.prof"'
+      else:
+        response = HttpResponse(profile.format_stacks(), content_type='text/plain')
+        response['Content-Disposition'] = f'attachment; filename="profile-{profile.id}.folded"'
+      return response
+    data = profile.summary()
+    data['sql'] = [{'sql': sql, 'ms': round(ms, 3)} for sql, ms in profile.queries]
+    data['stats'] = profile.format_stats()
+    data['stacks'] = profile.format_stacks()
+    return HttpResponse(json.dumps(data))
@@ -0,0 +1,21 @@
+from django.template.loader import get_template
+from django.urls import get_resolver
+
+from . import schedule
+from .services import CategoryService, SiteService
+
+TEMPLATES = ['layout.html', 'article.html', 'articles.html']
+
+
+def warm_up() -> None:
+  '''
+  Does the lazy work of the first requests up front: imports the URLconf
+  and the views, compiles the templates, loads the sites, the category tree
+  and the publishing schedules.
+  '''
+  get_resolver().url_patterns
+  for name in TEMPLATES:
+    get_template(name)
+  for site in SiteService.get_ids():
+    CategoryService._get_tree(site)
+    schedule.next_change(site)
@@ -0,0 +1,7 @@
+from django.contrib import admin
+
+# Imported on the first request under the admin prefix, see gazpacho.urls
+admin.autodiscover()
+
+app_name = 'admin'
+urlpatterns = admin.site.get_urls()
@@ -32,7 +32,8 @@ ALLOWED_HOSTS: List[str] = []
 
 INSTALLED_APPS = [
   'cms.apps.CmsConfig',
-  'django.contrib.admin',
+  # Does not import the admin modules of the apps at startup, see gazpacho.admin_urls
+  'django.contrib.admin.apps.SimpleAdminConfig',
   'django.contrib.auth',
   'django.contrib.contenttypes',
   'django.contrib.sessions',
@@ -41,15 +42,31 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+  'cms.middleware.ProfilingMiddleware',
   'django.middleware.security.SecurityMiddleware',
-  'django.contrib.sessions.middleware.SessionMiddleware',
+  'cms.middleware.SiteMiddleware',
+  'cms.middleware.FastPathMiddleware',
+  'cms.middleware.TokenAuthenticationMiddleware',
+  'cms.middleware.RateLimitMiddleware',
+  'cms.middleware.SessionMiddleware',
   'django.middleware.common.CommonMiddleware',
-  'django.middleware.csrf.CsrfViewMiddleware',
-  'django.contrib.auth.middleware.AuthenticationMiddleware',
-  'django.contrib.messages.middleware.MessageMiddleware',
+  'cms.middleware.CsrfViewMiddleware',
+  'cms.middleware.AuthenticationMiddleware',
+  'cms.middleware.MessageMiddleware',
   'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Reads of public pages matching these patterns skip the session, csrf,
+# auth and messages middleware
+CMS_FAST_PATH = True
+CMS_FAST_PATH_URLS = [
+  r'^/$',
+  r'^/a/',
+  r'^/c/',
+  r'^/feed$',
+  r'^/sitemap',
+]
+
 ROOT_URLCONF = 'gazpacho.urls'
 
 TEMPLATES = [
@@ -92,6 +109,25 @@ DATABASES = {
   }
 }
 
+# Shared by the web workers and ./manage.py runworker: writes expire cached
+# pages, feeds, the category tree and the sites of every process through it.
+# A process local cache (LocMemCache) only suits a single process, see cms.checks.
+CACHES = {
+  'default': {
+    'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+    'LOCATION': '127.0.0.1:11211',
+  }
+}
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+AUTHENTICATION_BACKENDS = [
+  'cms.auth.CachedModelBackend',
+]
+
+# How long users of sessions and API tokens stay cached
+CMS_USER_CACHE_SECONDS = 300
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 
@@ -132,3 +168,72 @@ STATICFILES_DIRS = [
   os.path.join(BASE_DIR, 'static'),
 ]
 CSRF_HEADER_NAME = 'HTTP_X_CSRFTOKEN'
+
+# Rendered pages are served from cache for CMS_PAGE_CACHE_FRESH_SECONDS, then
+# served stale for up to CMS_PAGE_CACHE_STALE_SECONDS while being refreshed.
+CMS_PAGE_CACHE_FRESH_SECONDS = 30
+CMS_PAGE_CACHE_STALE_SECONDS = 600
+
+# 'database' stores follow-up work of writes for ./manage.py runworker,
+# 'local' runs it in the writing process once the transaction commits.
+CMS_TASK_QUEUE = 'database'
+CMS_TASK_MAX_ATTEMPTS = 5
+
+# The category tree is cached in the shared cache and expired by writes, the
+# timeout bounds how long a missed expiry can last
+CMS_CATEGORY_TREE_CACHE_SECONDS = 300
+
+# Load the views, templates and category tree before a WSGI worker accepts traffic
+CMS_WARM_UP = False
+
+# The default site, served on hosts without a Site of their own
+CMS_SITE_TITLE = 'GazpachoCMS'
+CMS_SITE_SLOGAN = 'JS-Free Content Management System'
+CMS_SITE_SIDEBAR = [
+  ['Home', '/'],
+  ['About Me', '/a/about'],
+  ['Articles about cats', '/c/cats'],
+]
+CMS_BASE_URL = 'http://localhost:8000'
+# Sites by host are cached like the category tree, the timeout bounds a missed expiry
+CMS_SITES_CACHE_SECONDS = 300
+
+# Sitemaps and feeds are regenerated when writes expire them
+CMS_SITEMAP_CHUNK_SIZE = 10000
+CMS_FEED_SIZE = 20
+CMS_FEED_CACHE_FRESH_SECONDS = 3600
+CMS_FEED_CACHE_STALE_SECONDS = 86400
+
+# Admin lists of larger tables show an estimated count from the table statistics
+CMS_ADMIN_EXACT_COUNT_LIMIT = 100000
+
+# Every n-th article revision stores the full content, the others a delta
+CMS_REVISION_SNAPSHOT_INTERVAL = 16
+
+# Requests per second and burst size allowed per client. The store is 'local'
+# for token buckets per process, 'cache' for counters shared by all workers,
+# allowing the burst per burst / rate seconds, or None to disable the limit.
+CMS_RATE_LIMIT_STORE = 'local'
+CMS_RATE_LIMIT_RATE = 20.0
+CMS_RATE_LIMIT_BURST = 200.0
+CMS_RATE_LIMIT_LOCAL_KEYS = 10000
+# Request header holding the client address when behind a proxy, e.g. 'HTTP_X_FORWARDED_FOR'
+CMS_CLIENT_ADDRESS_HEADER = None
+
+# Requests per process allowed to run an expensive operation at once, the
+# others get a 503 asking to retry after CMS_CONCURRENCY_RETRY_AFTER seconds
+CMS_CONCURRENCY_LIMITS = {
+  'category': 8,
+}
+CMS_CONCURRENCY_RETRY_AFTER = 5
+
+# Opt-in request profiling. A CMS_PROFILE_SAMPLE_RATE fraction of requests
+# runs under cProfile, requests slower than CMS_PROFILE_SLOW_MS (None to
+# disable) get their stacks sampled every CMS_PROFILE_INTERVAL_MS, and both
+# record their queries. Staff download the last CMS_PROFILE_KEEP profiles of
+# the worker answering them at api/profiles.
+CMS_PROFILE = False
+CMS_PROFILE_SAMPLE_RATE = 0.01
+CMS_PROFILE_SLOW_MS = 500
+CMS_PROFILE_INTERVAL_MS = 10
+CMS_PROFILE_KEEP = 50
@@ -13,10 +13,11 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.contrib import admin
 from django.urls import path, include
 
 urlpatterns = [
-  path('djangoadmin/', admin.site.urls),
+  # The admin is loaded lazily: the resolver imports the module named by a
+  # string only when a request or a reverse() reaches the admin namespace
+  path('djangoadmin/', ('gazpacho.admin_urls', 'admin', 'admin')),
   path('', include('cms.urls')),
 ]